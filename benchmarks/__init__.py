@@ -0,0 +1,8 @@
+"""
+Benchmarks for the account lifecycle.
+
+Run them with ``python -m benchmarks`` from the project directory. They
+use a throwaway SQLite database and the in-memory SMS and email
+backends, so they don't need a network connection. The results are
+written as JSON so that they can be compared between commits.
+"""
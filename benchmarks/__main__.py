@@ -0,0 +1,152 @@
+"""
+Runs the benchmarks and writes the results as JSON.
+
+Usage: python -m benchmarks [--sizes 1000,10000,100000] [--iterations N]
+                            [--scenario NAME] [--plain-database]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks the account lifecycle views.'
+    )
+    parser.add_argument(
+        '--sizes',
+        default='1000,10000,100000',
+        help='Comma-separated numbers of rows in each token table.'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=20,
+        help='Number of requests timed in each scenario.'
+    )
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        help='Only run the named scenario. Can be given more than once.'
+    )
+    parser.add_argument(
+        '--concurrency',
+        default='1,4,16',
+        help='Comma-separated numbers of concurrent logins to run.'
+    )
+    parser.add_argument(
+        '--fast-hashing',
+        action='store_true',
+        help=(
+            'Hash passwords with MD5, to measure everything except '
+            'password hashing.'
+        )
+    )
+    parser.add_argument(
+        '--plain-database',
+        action='store_true',
+        help=(
+            "Connect to the database with Django's default options instead "
+            'of those in the selected DJANGO_DATABASE profile.'
+        )
+    )
+    parser.add_argument(
+        '--output',
+        help='File to write the results to, instead of standard output.'
+    )
+    return parser.parse_args()
+
+
+def run(args):
+    """
+    Runs the selected scenarios at each table size.
+    """
+    import django
+    from django.conf import settings
+    from django.test.utils import (
+        setup_databases, setup_test_environment, teardown_databases,
+        teardown_test_environment
+    )
+
+    from benchmarks.runner import (
+        query_counter, run_concurrently, run_scenario
+    )
+    from benchmarks.scenarios import CONCURRENT_SCENARIOS, SCENARIOS
+    from benchmarks.seed import seed_token_tables
+
+    names = args.scenario or list(SCENARIOS) + list(CONCURRENT_SCENARIOS)
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    concurrency = [int(level) for level in args.concurrency.split(',')]
+    results = []
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    query_counter.install()
+    try:
+        for size in sizes:
+            print('Seeding {0} rows per table...'.format(size),
+                  file=sys.stderr)
+            seed_token_tables(size)
+            for name in names:
+                print('Running {0}...'.format(name), file=sys.stderr)
+                if name in CONCURRENT_SCENARIOS:
+                    request = CONCURRENT_SCENARIOS[name]()
+                    for level in concurrency:
+                        result = asyncio.run(run_concurrently(
+                            request,
+                            level,
+                            args.iterations
+                        ))
+                        results.append(
+                            dict(scenario=name, table_size=size, **result)
+                        )
+                else:
+                    result = run_scenario(SCENARIOS[name], args.iterations)
+                    results.append(
+                        dict(scenario=name, table_size=size, **result)
+                    )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'cpu_count': os.cpu_count(),
+        'iterations': args.iterations,
+        'fast_hashing': args.fast_hashing,
+        'database': settings.DATABASE_PROFILE,
+        'plain_database': args.plain_database,
+        'results': results,
+    }
+
+
+def main():
+    args = parse_args()
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ.setdefault('DJANGO_DEBUG', 'False')
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmarks')
+    os.environ.setdefault('SECRET_KEY', 'benchmarks')
+    if args.fast_hashing:
+        os.environ['BENCHMARKS_FAST_HASHING'] = 'True'
+    if args.plain_database:
+        os.environ['BENCHMARKS_PLAIN_DATABASE'] = 'True'
+    import django
+    django.setup()
+    # Anything the views print would otherwise end up in the results.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
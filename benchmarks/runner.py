@@ -0,0 +1,141 @@
+"""
+Times requests and summarises the results.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class QueryCounter:
+    """
+    Counts the queries made on every database connection, whichever
+    thread it belongs to.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+        connection_created.connect(self._connection_created)
+
+    def _connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+query_counter = QueryCounter()
+
+
+def percentile(values, percent):
+    """
+    Returns the given percentile of the values, using the nearest rank.
+    """
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarise(latencies, queries, cpu_time, statuses):
+    """
+    Returns the statistics reported for a scenario.
+
+    Latencies and CPU time are given in seconds and reported in
+    milliseconds.
+    """
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries': round(queries / len(latencies), 2),
+        'cpu_ms': round(cpu_time / len(latencies) * 1000, 3),
+        'statuses': dict(Counter(statuses)),
+    }
+
+
+def run_scenario(scenario, iterations):
+    """
+    Runs each request yielded by the scenario and returns the results.
+
+    Scenarios set up anything a request depends on before yielding it,
+    so that only the request itself is timed.
+    """
+    latencies = []
+    statuses = []
+    queries = 0
+    cpu_time = 0
+    for request in scenario(iterations):
+        query_count = query_counter.count
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        response = request()
+        latencies.append(time.perf_counter() - start)
+        cpu_time += time.process_time() - cpu_start
+        queries += query_counter.count - query_count
+        statuses.append(getattr(response, 'status_code', None))
+    return summarise(latencies, queries, cpu_time, statuses)
+
+
+async def _probe_event_loop(lags, interval=0.005):
+    """
+    Records how late the event loop wakes up from a short sleep.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run_concurrently(request, concurrency, iterations):
+    """
+    Makes the request `iterations` times, `concurrency` at a time, on
+    one event loop, and returns the results.
+
+    Alongside the usual statistics, reports the throughput and how long
+    the event loop was blocked while the requests ran.
+    """
+    latencies = []
+    statuses = []
+    lags = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed_request():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await request()
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    probe = asyncio.create_task(_probe_event_loop(lags))
+    query_count = query_counter.count
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(timed_request() for i in range(iterations)))
+    elapsed = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+    probe.cancel()
+    results = summarise(
+        latencies,
+        query_counter.count - query_count,
+        cpu_time,
+        statuses
+    )
+    results['concurrency'] = concurrency
+    results['requests_per_second'] = round(iterations / elapsed, 2)
+    results['loop_lag_p99_ms'] = round(percentile(lags, 99) * 1000, 3)
+    results['loop_lag_max_ms'] = round(max(lags) * 1000, 3)
+    return results
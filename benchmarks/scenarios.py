@@ -0,0 +1,214 @@
+"""
+Defines the benchmarked scenarios.
+
+Each scenario is a generator that yields one function per request to
+time, after setting up whatever that request depends on.
+"""
+
+import itertools
+import json
+import re
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.template.loader import render_to_string
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from drivers import sms
+from drivers.mail import get_queue
+from profiles.models import EmailToken, ResetPasswordToken, User
+
+
+PASSWORD = 'Benchmark-Password-1'
+
+_user_numbers = itertools.count()
+
+
+def _create_user():
+    """
+    Creates a user with a unique email address.
+    """
+    user = User(email='user{0}@example.com'.format(next(_user_numbers)))
+    user.set_password(PASSWORD)
+    user.save()
+    return user
+
+
+def _logged_in_client(user):
+    """
+    Returns a client logged in as the user, after one request has
+    loaded anything that is cached between requests.
+    """
+    client = Client()
+    client.force_login(user)
+    client.get(reverse('dashboard'))
+    return client
+
+
+def _get_emailed_token(url_name):
+    """
+    Returns the token in the link in the most recent email.
+    """
+    get_queue().flush()
+    path = reverse(url_name, args=['X' * 32]).replace('X' * 32, '')
+    match = re.search(
+        re.escape(path) + r'([A-Za-z0-9]{32})',
+        mail.outbox[-1].body
+    )
+    return match.group(1)
+
+
+def signup(iterations):
+    for i in range(iterations):
+        email = 'signup{0}@example.com'.format(next(_user_numbers))
+        data = {
+            'email': email,
+            'confirm_email': email,
+            'password': PASSWORD,
+            'confirm_password': PASSWORD,
+            'secret_key': settings.SECRET_SAUCE,
+        }
+        yield lambda: Client().post(reverse('create_user'), data)
+
+
+def sms_verification(iterations):
+    for i in range(iterations):
+        client = _logged_in_client(_create_user())
+
+        def request():
+            client.post(
+                reverse('verify_mobile_number'),
+                json.dumps({'mobile_number': '6135550100'}),
+                content_type='application/json'
+            )
+            sms_token = re.search(r'\d{6}', sms.messages[-1].message)
+            return client.post(
+                reverse('add_mobile_number'),
+                {
+                    'mobile_number': '6135550100',
+                    'sms_token': sms_token.group(0),
+                }
+            )
+
+        yield request
+
+
+def email_verification(iterations):
+    for i in range(iterations):
+        user = _create_user()
+        EmailToken(user=user, email=user.email).save()
+        url = reverse(
+            'email_verification',
+            args=[_get_emailed_token('email_verification')]
+        )
+        yield lambda: Client().get(url)
+
+
+def login(iterations):
+    user = _create_user()
+    data = {'username': user.email, 'password': PASSWORD}
+    for i in range(iterations):
+        yield lambda: Client().post(reverse('login'), data)
+
+
+def dashboard(iterations):
+    client = _logged_in_client(_create_user())
+    for i in range(iterations):
+        yield lambda: client.get(reverse('dashboard'))
+
+
+def forgotten_password(iterations):
+    """
+    Times a reset request, which is padded to a minimum response time.
+    The latency is how long each request holds a connection open.
+    """
+    user = _create_user()
+    for i in range(iterations):
+        yield lambda: Client().post(
+            reverse('forgotten_password_handler'),
+            {'email': user.email}
+        )
+
+
+def reset_password(iterations):
+    for i in range(iterations):
+        async_to_sync(ResetPasswordToken(user=_create_user()).asave)()
+        url = reverse(
+            'reset_password',
+            args=[_get_emailed_token('reset_password')]
+        )
+
+        def request():
+            client = Client()
+            client.get(url)
+            return client.post(url, {
+                'password': PASSWORD + '!',
+                'confirm_password': PASSWORD + '!',
+            })
+
+        yield request
+
+
+def render_templates(iterations):
+    """
+    Times rendering both emails and the login page, without the
+    database.
+    """
+    token = 'X' * 32
+    for i in range(iterations):
+
+        def request():
+            EmailToken()._get_email_content(token)
+            ResetPasswordToken()._get_email_content(token)
+            render_to_string('login.html')
+
+        yield request
+
+
+SCENARIOS = {
+    'signup': signup,
+    'sms_verification': sms_verification,
+    'email_verification': email_verification,
+    'login': login,
+    'dashboard': dashboard,
+    'forgotten_password': forgotten_password,
+    'reset_password': reset_password,
+    'render_templates': render_templates,
+}
+
+
+def concurrent_login():
+    """
+    Returns a function that logs in with a new client each time, to be
+    run concurrently on one event loop.
+    """
+    data = {'username': _create_user().email, 'password': PASSWORD}
+
+    async def request():
+        return await AsyncClient().post(reverse('login'), data)
+
+    return request
+
+
+def concurrent_dashboard():
+    """
+    Returns a function that loads the dashboard as a logged-in user, to
+    be run concurrently on one event loop.
+    """
+    client = AsyncClient()
+    client.force_login(_create_user())
+
+    async def request():
+        return await client.get(reverse('dashboard'))
+
+    return request
+
+
+# Scenarios that return a single request function, run many times at
+# each level of concurrency to measure throughput.
+CONCURRENT_SCENARIOS = {
+    'concurrent_login': concurrent_login,
+    'concurrent_dashboard': concurrent_dashboard,
+}
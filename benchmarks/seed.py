@@ -0,0 +1,62 @@
+"""
+Fills the token tables with rows to benchmark against.
+"""
+
+import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from profiles.hashers import make_token_hash
+from profiles.models import (
+    EmailToken, PhoneToken, ResetPasswordToken, TOKEN_LIFETIME, User
+)
+
+
+def seed_token_tables(size, batch_size=1000):
+    """
+    Adds users and tokens until each token table has `size` rows.
+
+    Every other batch of tokens is backdated so that it has expired,
+    as about half of a real table would be.
+    """
+    existing = PhoneToken.objects.count()
+    # Every seeded token shares one hash; none of them are ever checked.
+    password = make_password('benchmark-password')
+    token_hash = make_token_hash('000000')
+    expired = timezone.now() - TOKEN_LIFETIME - datetime.timedelta(hours=1)
+    for start in range(existing, size, batch_size):
+        stop = min(start + batch_size, size)
+        users = User.objects.bulk_create([
+            User(email='seed{0}@example.com'.format(i), password=password)
+            for i in range(start, stop)
+        ])
+        created = [
+            PhoneToken.objects.bulk_create([
+                PhoneToken(token=token_hash, phone='+16135550100', user=user)
+                for user in users
+            ]),
+            EmailToken.objects.bulk_create([
+                EmailToken(
+                    selector='s{0:011d}'.format(user.pk),
+                    token=password,
+                    email=user.email,
+                    user=user
+                )
+                for user in users
+            ]),
+            ResetPasswordToken.objects.bulk_create([
+                ResetPasswordToken(
+                    selector='s{0:011d}'.format(user.pk),
+                    token=password,
+                    user=user
+                )
+                for user in users
+            ]),
+        ]
+        if (start // batch_size) % 2:
+            for tokens in created:
+                model = type(tokens[0])
+                model.objects.filter(
+                    pk__in=[token.pk for token in tokens]
+                ).update(datetime=expired)
@@ -0,0 +1,51 @@
+"""
+Settings used to run the benchmarks.
+"""
+
+import os
+import tempfile
+
+from config.settings import *  # noqa: F401,F403
+
+
+# The benchmarks run against a SQLite file (rather than an in-memory
+# database) so that reads and writes cost what they do in production.
+DATABASES['default']['TEST'] = {  # noqa: F405
+    'NAME': os.path.join(tempfile.gettempdir(), 'benchmarks.sqlite3'),
+}
+
+# To compare against the database profiles, --plain-database connects
+# with Django's default options, as the project did before them.
+if os.environ.get('BENCHMARKS_PLAIN_DATABASE') == 'True':
+    for option in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+        DATABASES['default'].pop(option, None)  # noqa: F405
+
+# The benchmarks don't serve static files, so they don't need them to
+# be collected first.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE  # noqa: F405
+    if middleware != 'whitenoise.middleware.WhiteNoiseMiddleware'
+]
+
+SMS_BACKEND = 'drivers.backends.locmem.SmsBackend'
+
+EMAIL_QUEUE_BACKEND = 'drivers.queues.locmem.MailQueue'
+
+# Every scenario repeats requests from the same client, which would
+# otherwise be rate limited.
+THROTTLE_RATES = {
+    'login': (10 ** 9, 60),
+    'forgotten_password': (10 ** 9, 60),
+    'verify_mobile_number': (10 ** 9, 60),
+}
+
+if os.environ.get('BENCHMARKS_FAST_HASHING') == 'True':
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
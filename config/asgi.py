@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Compile templates at startup rather than during the first requests.
+from profiles.utils import warm_template_cache  # noqa: E402
+
+warm_template_cache()
@@ -36,7 +36,8 @@ def get_env_variable(var_name):
 SECRET_KEY = get_env_variable('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Set the DJANGO_DEBUG environment variable to 'False' in production.
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = []
 
@@ -51,10 +52,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'phonenumber_field',
+    'drivers',
     'profiles',
 ]
 
 MIDDLEWARE = [
+    'profiles.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,7 +71,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'profiles.instrumentation.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,25 +84,173 @@ TEMPLATES = [
     },
 ]
 
+if not DEBUG:
+    # In production, compile each template once per process and keep it
+    # in memory, without checking whether the file has changed.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# The DJANGO_DATABASE environment variable selects the database to use:
+# 'sqlite' (the default), 'postgresql' or 'mysql'. The server databases
+# read their connection details from the DB_NAME, DB_USER, DB_PASSWORD,
+# DB_HOST and DB_PORT environment variables.
+DATABASE_PROFILE = os.environ.get('DJANGO_DATABASE', 'sqlite')
+
+if DATABASE_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds to wait for a lock before raising an error.
+                'timeout': 5,
+                # Take the write lock at the start of each transaction,
+                # which avoids "database is locked" errors when a read
+                # transaction is upgraded to a write.
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers run alongside a writer, and NORMAL
+                # syncing is safe in WAL mode. Memory-map up to 128MB.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
+    }
+elif DATABASE_PROFILE == 'postgresql':
+    # Connections are reused through psycopg's connection pool, which
+    # is safe to use under ASGI. Pooling can't be combined with
+    # persistent connections, so CONN_MAX_AGE stays at 0.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': get_env_variable('DB_NAME'),
+            'USER': get_env_variable('DB_USER'),
+            'PASSWORD': get_env_variable('DB_PASSWORD'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                },
+            },
+        }
+    }
+elif DATABASE_PROFILE == 'mysql':
+    # MySQL has no connection pool in Django, so connections are kept
+    # open between requests and checked before being reused.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': get_env_variable('DB_NAME'),
+            'USER': get_env_variable('DB_USER'),
+            'PASSWORD': get_env_variable('DB_PASSWORD'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    raise ImproperlyConfigured(
+        'DJANGO_DATABASE must be one of sqlite, postgresql or mysql'
+    )
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Set the REDIS_URL environment variable to use a Redis server as the
+# cache. Without it, each process has its own cache in memory, which is
+# only suitable for things that don't need to be the same in every
+# process, so sessions and users aren't cached.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+
+# The DJANGO_SESSION_MODE environment variable selects where sessions
+# are stored: 'db' uses the database, 'cached_db' reads sessions from
+# the cache and only writes them to the database when their data
+# changes, and 'cache' keeps them in the cache alone. The cached modes
+# need a cache shared by every process, such as Redis, so that logging
+# out in one process ends the session in all of them; they're the
+# default when REDIS_URL is set.
+SESSION_MODE = os.environ.get(
+    'DJANGO_SESSION_MODE',
+    'cached_db' if REDIS_URL else 'db'
+)
+
+SESSION_ENGINES = {
+    'cached_db': 'profiles.sessions',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'db': 'django.contrib.sessions.backends.db',
 }
 
+try:
+    SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+except KeyError:
+    raise ImproperlyConfigured(
+        'DJANGO_SESSION_MODE must be one of cached_db, cache or db'
+    )
+
+# Cache used to store logged-in users between requests (for
+# USER_CACHE_TIMEOUT seconds), or None to load them from the database
+# on every request. Users are removed from the cache whenever they're
+# saved, so it must be shared by every process; otherwise a password
+# change wouldn't end the user's sessions in other processes.
+USER_CACHE = 'default' if REDIS_URL else None
+USER_CACHE_TIMEOUT = 5 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
 AUTH_USER_MODEL = 'profiles.User'
 
+AUTHENTICATION_BACKENDS = ['profiles.backends.ModelBackend']
+
+# Passwords are hashed in a pool of workers so that hashing doesn't
+# block the event loop. Use 'thread' for hashers that release the GIL,
+# such as the default PBKDF2 hasher, or 'process' for hashers that don't.
+PASSWORD_HASHING_EXECUTOR = 'thread'
+PASSWORD_HASHING_WORKERS = os.cpu_count()
+
+# Number of threads used for work that responses don't wait for, such as
+# sending reset password links.
+BACKGROUND_TASK_WORKERS = 4
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -121,6 +272,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Set the BREACHED_PASSWORDS_FILE environment variable to the path of a
+# file made with the build_breached_passwords management command to
+# reject passwords that have appeared in data breaches.
+BREACHED_PASSWORDS_FILE = os.environ.get('BREACHED_PASSWORDS_FILE')
+
+if BREACHED_PASSWORDS_FILE:
+    AUTH_PASSWORD_VALIDATORS.append({
+        'NAME': 'profiles.utils.BreachedPasswordValidator',
+        'OPTIONS': {
+            'path': BREACHED_PASSWORDS_FILE,
+        },
+    })
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -143,6 +307,28 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Directory that collectstatic copies static files to.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+if not DEBUG:
+    # In production, collectstatic adds a hash of each file's contents
+    # to its name and writes gzip and Brotli compressed copies, which
+    # WhiteNoise serves with headers telling browsers to cache them
+    # forever. Build the files in static/ with 'npm run build:production'
+    # first.
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+        },
+    }
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+        'whitenoise.middleware.WhiteNoiseMiddleware'
+    )
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -156,11 +342,118 @@ SECRET_SAUCE = get_env_variable('SECRET_KEY')
 # file on the local filesystem.
 SMS_BACKEND = 'drivers.backends.locmem.SmsBackend'
 
+# Maximum number of messages kept by the in-memory SMS backend. Older
+# messages are discarded once it's full.
+SMS_OUTBOX_SIZE = 1000
+
 # The site's domain name and scheme to use.
 DOMAIN = 'localhost:8000'
 SCHEME = 'http'
 
+# Cache used to store pages that are the same for every visitor without
+# a session, such as the login page, and how long to keep them (in
+# seconds). Pages aren't cached in development so that changes to
+# templates show up straight away.
+PAGE_CACHE = 'default'
+PAGE_CACHE_TIMEOUT = 0 if DEBUG else 60 * 60
+
+# Maximum number of attempts allowed per client IP address and per
+# account within a period (in seconds), and the cache used to count
+# them. Attempts over the limit are rejected before any password or
+# token is hashed. Only failed logins count towards the login limit.
+THROTTLE_CACHE = 'default'
+THROTTLE_RATES = {
+    'login': (10, 60),
+    'forgotten_password': (5, 60 * 60),
+    'verify_mobile_number': (5, 60 * 60),
+}
+
+# Number of seconds taken to respond to a forgotten password request,
+# and the maximum random delay added on top. Reset links are sent in
+# the background, so responses take this long whether or not the
+# account exists.
+FORGOTTEN_PASSWORD_RESPONSE_TIME = 0.5
+FORGOTTEN_PASSWORD_RESPONSE_JITTER = 0.1
+
+# Whether to report how long each stage of a request took in its
+# Server-Timing header. The same timings are always collected for the
+# histogram served at /api/user/timings to the users in ADMINS. Leave
+# this off in production: the timings would reveal whether an account
+# exists to anyone using the forgotten password form.
+SERVER_TIMING = DEBUG
+
+# Users who can see the request timings, as (name, email) tuples.
+ADMINS = []
+
+# Records logged by the project are written to standard error as JSON,
+# one per line, by a background thread. Each record includes the ID of
+# the request it was logged during. A record with the timings of every
+# request is logged to 'profiles.requests'; only a sample of them
+# (REQUEST_LOG_SAMPLE_RATE) is kept.
+REQUEST_LOG_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'profiles.log.RequestIdFilter',
+        },
+        'sample': {
+            '()': 'profiles.log.SamplingFilter',
+            'rate': REQUEST_LOG_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'profiles.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'profiles.log.QueueHandler',
+            'formatter': 'json',
+            'filters': ['request_id'],
+        },
+    },
+    'loggers': {
+        'profiles': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+        },
+        'profiles.requests': {
+            'filters': ['sample'],
+        },
+        'drivers': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+        },
+    },
+}
+
 # Email settings.
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = BASE_DIR / '../inbox'
+
+# Emails are added to a queue and delivered in batches, so that sending
+# an email never holds up a request. The in-memory queue is delivered by
+# a background thread in each process, and is only meant for
+# development: emails it can't send within EMAIL_QUEUE_SHUTDOWN_TIMEOUT
+# seconds of the process exiting are lost. In production, use
+# 'drivers.queues.database.MailQueue' to store the queue in the database
+# and deliver it with the send_queued_mail management command.
+EMAIL_QUEUE_BACKEND = os.environ.get(
+    'DJANGO_EMAIL_QUEUE_BACKEND',
+    'drivers.queues.locmem.MailQueue'
+)
+EMAIL_QUEUE_SHUTDOWN_TIMEOUT = 30
+
+# Maximum number of emails sent over a single connection.
+EMAIL_QUEUE_BATCH_SIZE = 100
+
+# Number of times to try sending an email before giving up, and the
+# number of seconds to wait before the first retry (doubled after each
+# failed attempt).
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 30
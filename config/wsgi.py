@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Compile templates at startup rather than during the first requests.
+from profiles.utils import warm_template_cache  # noqa: E402
+
+warm_template_cache()
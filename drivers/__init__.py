@@ -1 +1,2 @@
-from .sms import send_sms_message
+from .mail import aqueue_mail, queue_mail
+from .sms import asend_sms_message, send_sms_message, send_sms_messages
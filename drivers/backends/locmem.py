@@ -2,27 +2,119 @@
 Defines SMS backend that stores messages in memory.
 """
 
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+
 from drivers import sms
 
 
+logger = logging.getLogger(__name__)
+
+
 class Message:
 
+    __slots__ = ('message', 'recipient')
+
     def __init__(self, message, recipient_number):
         self.message = message
         self.recipient = recipient_number
 
 
+class Outbox:
+    """
+    Keeps the most recent SMS messages sent, up to a maximum number.
+
+    Older messages are discarded as new ones arrive, so the outbox uses
+    the same amount of memory however many messages are sent. The latest
+    message sent to each number can be looked up directly.
+    """
+
+    def __init__(self, maxlen):
+        self._messages = deque(maxlen=maxlen)
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._messages))
+
+    def __getitem__(self, index):
+        with self._lock:
+            return self._messages[index]
+
+    def append(self, message):
+        with self._lock:
+            self._append(message)
+
+    def extend(self, messages):
+        with self._lock:
+            for message in messages:
+                self._append(message)
+
+    def _append(self, message):
+        messages = self._messages
+        if len(messages) == messages.maxlen:
+            oldest = messages[0]
+            if self._latest.get(oldest.recipient) is oldest:
+                del self._latest[oldest.recipient]
+        messages.append(message)
+        self._latest[message.recipient] = message
+
+    def get_latest(self, recipient_number):
+        """
+        Returns the latest message sent to the number, or None.
+        """
+        with self._lock:
+            return self._latest.get(recipient_number)
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self._latest.clear()
+
+
 class SmsBackend:
 
     def __init__(self, *args, **kwargs):
         """
-        Stores all delivered SMS messages in a list.
+        Stores delivered SMS messages in an outbox of limited size.
         """
         if not hasattr(sms, 'messages'):
-            sms.messages = []
+            sms.messages = Outbox(settings.SMS_OUTBOX_SIZE)
 
     def send_message(self, message, recipient_number):
         """
-        Redirect message to dummy outbox list.
+        Redirect message to dummy outbox.
         """
         sms.messages.append(Message(message, recipient_number))
+        logger.info('SMS to %s: %s', recipient_number, message)
+
+    def send_messages(self, messages):
+        """
+        Redirect a batch of messages to dummy outbox.
+        """
+        sms.messages.extend(
+            Message(message, recipient_number)
+            for message, recipient_number in messages
+        )
+        for message, recipient_number in messages:
+            logger.info('SMS to %s: %s', recipient_number, message)
+        return len(messages)
+
+    async def asend_message(self, message, recipient_number):
+        """
+        Redirect message to dummy outbox.
+        """
+        self.send_message(message, recipient_number)
+
+    async def asend_messages(self, messages):
+        """
+        Redirect a batch of messages to dummy outbox.
+        """
+        return self.send_messages(messages)
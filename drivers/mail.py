@@ -0,0 +1,126 @@
+"""
+Defines tools for queueing emails and delivering them in batches.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+
+
+def get_queue():
+    """
+    Return the email queue instance used by this process.
+    """
+    global _queue
+    if _queue is None:
+        klass = import_string(settings.EMAIL_QUEUE_BACKEND)
+        _queue = klass()
+    return _queue
+
+
+@receiver(setting_changed)
+def reset_queue(*, setting, **kwargs):
+    global _queue
+    if setting == 'EMAIL_QUEUE_BACKEND':
+        _queue = None
+
+
+def build_email(subject, message, from_email, recipient_list,
+                 html_message=None):
+    """
+    Returns a dictionary describing an email that is waiting to be sent.
+    """
+    return {
+        'subject': subject,
+        'body': message,
+        'from_email': from_email,
+        'recipients': list(recipient_list),
+        'html_body': html_message or '',
+    }
+
+
+def queue_mail(subject, message, from_email, recipient_list,
+               html_message=None):
+    """
+    Adds an email to the queue instead of sending it right away.
+
+    Takes the same arguments as django.core.mail.send_mail().
+    """
+    email = build_email(
+        subject,
+        message,
+        from_email,
+        recipient_list,
+        html_message
+    )
+    get_queue().enqueue(email)
+
+
+async def aqueue_mail(subject, message, from_email, recipient_list,
+                      html_message=None):
+    """
+    Adds an email to the queue instead of sending it right away.
+    """
+    email = build_email(
+        subject,
+        message,
+        from_email,
+        recipient_list,
+        html_message
+    )
+    await get_queue().aenqueue(email)
+
+
+def deliver_emails(emails):
+    """
+    Sends the given emails using a single connection to the mail server.
+
+    Returns the emails that couldn't be sent.
+    """
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception('Unable to connect to the mail server')
+        return list(emails)
+    failed = []
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                email['subject'],
+                email['body'],
+                email['from_email'],
+                email['recipients'],
+                connection=connection
+            )
+            if email['html_body']:
+                message.attach_alternative(email['html_body'], 'text/html')
+            try:
+                message.send()
+            except Exception:
+                logger.exception(
+                    'Unable to send email to %s',
+                    ', '.join(email['recipients'])
+                )
+                failed.append(email)
+    finally:
+        connection.close()
+    return failed
+
+
+def get_retry_delay(attempts):
+    """
+    Returns the number of seconds to wait before retrying an email.
+
+    The delay doubles after each failed attempt.
+    """
+    return settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1)
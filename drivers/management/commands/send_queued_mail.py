@@ -0,0 +1,43 @@
+"""
+Delivers emails stored in the database queue.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drivers.mail import get_queue
+
+
+class Command(BaseCommand):
+
+    help = 'Sends emails that are waiting in the email queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send the emails that are due, then exit.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when the queue is empty.'
+        )
+
+    def handle(self, *args, **options):
+        email_queue = get_queue()
+        if not hasattr(email_queue, 'process'):
+            raise CommandError(
+                'The configured email queue is delivered in the background '
+                'by each process and cannot be processed by this command.'
+            )
+        while True:
+            sent = email_queue.process()
+            while sent:
+                self.stdout.write('Sent {0} emails.'.format(sent))
+                sent = email_queue.process()
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+"""
+Defines models used to store outgoing messages.
+"""
+
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedEmail(models.Model):
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField()
+    attempts = models.SmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    datetime = models.DateTimeField(auto_now_add=True)
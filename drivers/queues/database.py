@@ -0,0 +1,104 @@
+"""
+Defines an email queue that is stored in the database and delivered
+by the send_queued_mail management command.
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from drivers import mail
+from drivers.models import QueuedEmail
+
+
+logger = logging.getLogger(__name__)
+
+# Length of time for which a worker may hold a batch of emails before
+# another worker is allowed to pick them up.
+CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+class MailQueue:
+
+    def enqueue(self, email):
+        """
+        Adds an email to the queue.
+        """
+        QueuedEmail.objects.create(**email)
+
+    async def aenqueue(self, email):
+        """
+        Adds an email to the queue.
+        """
+        await QueuedEmail.objects.acreate(**email)
+
+    def _claim_batch(self):
+        """
+        Reserves a batch of emails that are due to be sent.
+        """
+        now = timezone.now()
+        # Without SKIP LOCKED, workers wait for each other's batches to be
+        # claimed instead of claiming different batches at once.
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic():
+            queued_emails = list(
+                QueuedEmail.objects.select_for_update(skip_locked=skip_locked)
+                .filter(
+                    attempts__lt=settings.EMAIL_QUEUE_MAX_ATTEMPTS,
+                    next_attempt__lte=now
+                )
+                .order_by('next_attempt')[:settings.EMAIL_QUEUE_BATCH_SIZE]
+            )
+            QueuedEmail.objects.filter(
+                pk__in=[queued_email.pk for queued_email in queued_emails]
+            ).update(next_attempt=now + CLAIM_TIMEOUT)
+        return queued_emails
+
+    def process(self):
+        """
+        Sends a batch of emails. Returns the number of emails sent.
+        """
+        queued_emails = self._claim_batch()
+        if not queued_emails:
+            return 0
+        emails = {}
+        for queued_email in queued_emails:
+            emails[queued_email.pk] = {
+                'subject': queued_email.subject,
+                'body': queued_email.body,
+                'from_email': queued_email.from_email,
+                'recipients': queued_email.recipients,
+                'html_body': queued_email.html_body,
+            }
+        failed = {
+            id(email) for email in mail.deliver_emails(list(emails.values()))
+        }
+        failed_ids = [
+            pk for pk, email in emails.items() if id(email) in failed
+        ]
+        sent_ids = [pk for pk in emails if pk not in failed_ids]
+        given_up_ids = []
+        for queued_email in queued_emails:
+            if queued_email.pk not in failed_ids:
+                continue
+            attempts = queued_email.attempts + 1
+            if attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+                logger.error(
+                    'Giving up on email to %s after %d attempts',
+                    ', '.join(queued_email.recipients),
+                    attempts
+                )
+                given_up_ids.append(queued_email.pk)
+            else:
+                QueuedEmail.objects.filter(pk=queued_email.pk).update(
+                    attempts=F('attempts') + 1,
+                    next_attempt=timezone.now() + datetime.timedelta(
+                        seconds=mail.get_retry_delay(attempts)
+                    )
+                )
+        QueuedEmail.objects.filter(pk__in=sent_ids + given_up_ids).delete()
+        return len(sent_ids)
@@ -0,0 +1,141 @@
+"""
+Defines an email queue that is stored in memory and delivered by a
+background thread in the same process.
+
+Emails still waiting when the process exits, including those waiting to
+be retried, are tried once more before it stops. Any that can't be sent
+within EMAIL_QUEUE_SHUTDOWN_TIMEOUT seconds are lost, so production
+sites should use the database queue.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+
+from drivers import mail
+
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+
+    def __init__(self, *args, **kwargs):
+        """
+        Creates an empty queue. The worker thread is started when the
+        first email is added.
+        """
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        # Emails waiting to be retried, keyed by their timers.
+        self._retries = {}
+        atexit.register(self._drain)
+
+    def enqueue(self, email):
+        """
+        Adds an email to the queue.
+        """
+        self._put(email, attempts=0)
+
+    async def aenqueue(self, email):
+        """
+        Adds an email to the queue. Never blocks the event loop.
+        """
+        self._put(email, attempts=0)
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every email in the queue has been processed, or
+        until timeout seconds have passed. Returns True if the queue was
+        emptied.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks,
+                timeout
+            )
+
+    def _put(self, email, attempts):
+        self._queue.put((email, attempts))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='mail-queue',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _next_batch(self):
+        """
+        Waits for an email, then takes up to a batch of queued emails.
+        """
+        batch = [self._queue.get()]
+        while len(batch) < settings.EMAIL_QUEUE_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._deliver(batch)
+            finally:
+                for item in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, batch):
+        attempts = {id(email): count + 1 for email, count in batch}
+        failed = mail.deliver_emails([email for email, count in batch])
+        for email in failed:
+            count = attempts[id(email)]
+            if count >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+                logger.error(
+                    'Giving up on email to %s after %d attempts',
+                    ', '.join(email['recipients']),
+                    count
+                )
+                continue
+            self._schedule_retry(email, count)
+
+    def _schedule_retry(self, email, attempts):
+        timer = threading.Timer(
+            mail.get_retry_delay(attempts),
+            lambda: self._retry(timer)
+        )
+        timer.daemon = True
+        with self._lock:
+            self._retries[timer] = (email, attempts)
+        timer.start()
+
+    def _retry(self, timer):
+        with self._lock:
+            retry = self._retries.pop(timer, None)
+        if retry is not None:
+            self._put(*retry)
+
+    def _drain(self):
+        """
+        Sends the emails left in the queue, and those waiting to be
+        retried, before the process exits.
+        """
+        with self._lock:
+            retries = self._retries
+            self._retries = {}
+        for timer, retry in retries.items():
+            timer.cancel()
+            self._put(*retry)
+        emptied = self.flush(timeout=settings.EMAIL_QUEUE_SHUTDOWN_TIMEOUT)
+        with self._lock:
+            lost = len(self._retries)
+        if not emptied:
+            lost += self._queue.unfinished_tasks
+        if lost:
+            logger.error('Dropping %d unsent emails at exit', lost)
@@ -2,10 +2,16 @@
 Defines tools for sending SMS messages.
 """
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 
 
+_connection = None
+
+
 def get_connection(backend=None, **kwargs):
     """
     Load an SMS backend and return an instance of it.
@@ -14,9 +20,70 @@ def get_connection(backend=None, **kwargs):
     return klass(**kwargs)
 
 
+def get_default_connection():
+    """
+    Return the instance of the default SMS backend used by this process.
+    """
+    global _connection
+    if _connection is None:
+        _connection = get_connection()
+    return _connection
+
+
+@receiver(setting_changed)
+def reset_connection(*, setting, **kwargs):
+    global _connection
+    if setting == 'SMS_BACKEND':
+        _connection = None
+
+
 def send_sms_message(message, recipient_number):
     """
     Uses SMS backend to send message to specified number.
     """
-    sms = get_connection()
+    sms = get_default_connection()
     return sms.send_message(message, recipient_number)
+
+
+def send_sms_messages(messages):
+    """
+    Uses SMS backend to send a batch of (message, recipient_number) pairs.
+
+    Backends that can send several messages at once should define a
+    send_messages() method; otherwise each message is sent in turn.
+    Returns the number of messages sent.
+    """
+    sms = get_default_connection()
+    if hasattr(sms, 'send_messages'):
+        return sms.send_messages(messages)
+    for message, recipient_number in messages:
+        sms.send_message(message, recipient_number)
+    return len(messages)
+
+
+async def asend_sms_message(message, recipient_number):
+    """
+    Uses SMS backend to send message to specified number.
+
+    Backends without an asend_message() method are run in a thread so
+    that they don't block the event loop.
+    """
+    sms = get_default_connection()
+    if hasattr(sms, 'asend_message'):
+        return await sms.asend_message(message, recipient_number)
+    return await sync_to_async(sms.send_message, thread_sensitive=False)(
+        message,
+        recipient_number
+    )
+
+
+async def asend_sms_messages(messages):
+    """
+    Uses SMS backend to send a batch of (message, recipient_number) pairs.
+    """
+    sms = get_default_connection()
+    if hasattr(sms, 'asend_messages'):
+        return await sms.asend_messages(messages)
+    return await sync_to_async(send_sms_messages, thread_sensitive=False)(
+        messages
+    )
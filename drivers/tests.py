@@ -0,0 +1,97 @@
+"""
+Tests for the drivers app.
+"""
+
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+
+from drivers.mail import build_email, get_queue
+from drivers.models import QueuedEmail
+from drivers.queues.locmem import MailQueue
+
+
+def make_email(number=0):
+    return build_email(
+        'Subject',
+        'Body',
+        'noreply@example.com',
+        ['user{0}@example.com'.format(number)]
+    )
+
+
+def count_connections():
+    """
+    Counts the connections opened to the mail server.
+    """
+    return mock.patch.object(
+        locmem.EmailBackend,
+        'open',
+        autospec=True,
+        return_value=True
+    )
+
+
+@override_settings(
+    EMAIL_QUEUE_BACKEND='drivers.queues.database.MailQueue',
+    EMAIL_QUEUE_MAX_ATTEMPTS=2,
+    EMAIL_QUEUE_RETRY_DELAY=0,
+)
+class DatabaseMailQueueTests(TestCase):
+
+    def setUp(self):
+        get_queue().enqueue(make_email())
+
+    def test_sends_emails(self):
+        self.assertEqual(get_queue().process(), 1)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_sends_batch_over_one_connection(self):
+        for number in range(1, 5):
+            get_queue().enqueue(make_email(number))
+        with count_connections() as open_connection:
+            self.assertEqual(get_queue().process(), 5)
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_gives_up_after_max_attempts(self):
+        with mock.patch(
+            'drivers.mail.deliver_emails',
+            side_effect=lambda emails: list(emails)
+        ):
+            self.assertEqual(get_queue().process(), 0)
+            self.assertEqual(QueuedEmail.objects.get().attempts, 1)
+            with self.assertLogs('drivers.queues.database', 'ERROR') as logs:
+                self.assertEqual(get_queue().process(), 0)
+        self.assertIn('user0@example.com', logs.output[0])
+        self.assertFalse(QueuedEmail.objects.exists())
+
+
+@override_settings(EMAIL_QUEUE_RETRY_DELAY=60)
+class LocmemMailQueueTests(TestCase):
+
+    def test_sends_batch_over_one_connection(self):
+        email_queue = MailQueue()
+        # Queued before the worker starts, so that they form one batch.
+        for number in range(4):
+            email_queue._queue.put((make_email(number), 0))
+        with count_connections() as open_connection:
+            email_queue.enqueue(make_email(4))
+            email_queue.flush()
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_retries_are_sent_at_exit(self):
+        email_queue = MailQueue()
+        with mock.patch(
+            'drivers.mail.deliver_emails',
+            side_effect=lambda emails: list(emails)
+        ):
+            email_queue.enqueue(make_email())
+            email_queue.flush()
+        self.assertEqual(len(mail.outbox), 0)
+        email_queue._drain()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(email_queue._retries, {})
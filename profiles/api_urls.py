@@ -1,5 +1,5 @@
 """
-Defines the URL used to validate a user's mobile number.
+Defines the URLs of API endpoints.
 """
 
 from django.urls import path
@@ -13,4 +13,5 @@ urlpatterns = [
         apis.verify_mobile_number,
         name='verify_mobile_number'
     ),
+    path('timings', apis.timings, name='timings'),
 ]
@@ -4,22 +4,37 @@ Defines API endpoints used by frontend scripts.
 
 import json
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import Http404, HttpResponse
 
-from drivers import sms
 from profiles import forms
+from profiles.instrumentation import histogram
+from profiles.throttling import (
+    get_client_ip, verify_mobile_number_rate_limiter
+)
 
 
 @login_required
 def verify_mobile_number(request):
     if request.method == 'POST':
+        if not verify_mobile_number_rate_limiter.allow(
+            ip=get_client_ip(request),
+            user=request.user.pk
+        ):
+            response = {
+                'error': 'Too many attempts. Please try again later.'
+            }
+            return HttpResponse(
+                json.dumps(response),
+                status=429,
+                content_type='application/json'
+            )
         data = json.loads(request.body)
         form = forms.MobileNumberForm(data)
         if form.is_valid():
             mobile_number = str(form.cleaned_data['mobile_number'])
             request.user.add_new_mobile_number(mobile_number)
-            print(sms.messages[0].message)
             return HttpResponse(content_type='application/json')
         else:
             response = {
@@ -31,3 +46,17 @@ def verify_mobile_number(request):
                 content_type='application/json'
             )
     raise Http404()
+
+
+@login_required
+def timings(request):
+    """
+    Returns the histogram of request timings recorded by this process.
+    """
+    admin_emails = {email for name, email in settings.ADMINS}
+    if request.user.email not in admin_emails:
+        raise Http404()
+    return HttpResponse(
+        json.dumps(histogram.get_summary()),
+        content_type='application/json'
+    )
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ProfilesConfig(AppConfig):
+
+    name = 'profiles'
+
+    def ready(self):
+        # Registers the system checks.
+        from profiles import checks  # noqa: F401
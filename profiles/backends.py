@@ -0,0 +1,83 @@
+"""
+Defines the backend used to authenticate users.
+"""
+
+from django.conf import settings
+from django.contrib.auth import backends, get_user_model
+from django.core.cache import caches
+
+from profiles.models import (
+    get_user_cache_key, get_user_version_key, new_user_version
+)
+
+
+UserModel = get_user_model()
+
+
+class ModelBackend(backends.ModelBackend):
+    """
+    Authenticates users without hashing passwords on the event loop.
+
+    If USER_CACHE is set, the user for each session is cached, so that
+    requests from users who are logged in don't need to query the
+    database. Users are cached under a version that is bumped whenever
+    they change, which is read before the user is loaded so that a
+    change made in the meantime isn't hidden by a stale copy.
+    """
+
+    def get_user(self, user_id):
+        if settings.USER_CACHE is None:
+            return super().get_user(user_id)
+        cache = caches[settings.USER_CACHE]
+        version = cache.get_or_set(
+            get_user_version_key(user_id),
+            new_user_version,
+            None
+        )
+        cache_key = get_user_cache_key(user_id, version)
+        user = cache.get(cache_key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(cache_key, user, settings.USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        if settings.USER_CACHE is None:
+            return await super().aget_user(user_id)
+        cache = caches[settings.USER_CACHE]
+        version = await cache.aget_or_set(
+            get_user_version_key(user_id),
+            new_user_version,
+            None
+        )
+        cache_key = get_user_cache_key(user_id, version)
+        user = await cache.aget(cache_key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(
+                    cache_key,
+                    user,
+                    settings.USER_CACHE_TIMEOUT
+                )
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None,
+                            **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(
+                username
+            )
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            await UserModel().aset_password(password)
+        else:
+            if (await user.acheck_password(password)
+                    and self.user_can_authenticate(user)):
+                return user
@@ -0,0 +1,66 @@
+"""
+Defines a pool of threads for work that the response shouldn't wait for.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    """
+    Returns the executor that background tasks run in.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS,
+                thread_name_prefix='background-task'
+            )
+    return _executor
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        if iscoroutinefunction(func):
+            async_to_sync(func)(*args)
+        else:
+            func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__qualname__)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(func, *args):
+    """
+    Calls the function (or coroutine function) in a background thread
+    and returns straight away.
+
+    Errors are logged rather than raised. Tasks still running when the
+    process exits are finished before it stops.
+    """
+    future = get_executor().submit(_run, func, args)
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+
+def wait_for_background_tasks():
+    """
+    Blocks until every background task started so far has finished.
+    """
+    wait(list(_pending))
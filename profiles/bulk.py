@@ -0,0 +1,203 @@
+"""
+Defines functions for importing and exporting users in bulk.
+"""
+
+import csv
+import itertools
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from profiles.hashers import make_passwords
+
+
+User = get_user_model()
+
+
+# Fields written to files of users by export_users().
+USER_FILE_FIELDS = ('email', 'password_hash', 'mobile_number')
+
+
+def read_users(f, file_format):
+    """
+    Yields the line number and a dict for each user in a file.
+
+    The file can be CSV with a header row, or JSON Lines with one
+    object per line. Lines that aren't valid JSON are yielded as None,
+    so that they're skipped by import_users() rather than ending it.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                yield line_number, record
+
+
+def _get_string(record, key):
+    value = record.get(key)
+    return '' if value is None else str(value)
+
+
+def _check_max_length(user):
+    """
+    Raises ValidationError if a field is too long for its column, which
+    would otherwise make the database reject the whole batch.
+    """
+    for field_name in ('email', 'mobile_number', 'password'):
+        max_length = User._meta.get_field(field_name).max_length
+        if len(getattr(user, field_name)) > max_length:
+            raise ValidationError(
+                '{0} is longer than {1} characters.'.format(
+                    field_name,
+                    max_length
+                )
+            )
+
+
+def _make_user(record):
+    """
+    Returns an unsaved user for the record, and its password if the
+    password still has to be hashed.
+
+    Raises ValidationError if the record is invalid.
+    """
+    if not isinstance(record, dict):
+        raise ValidationError('Each line must be a JSON object.')
+    email = User.objects.normalize_email(_get_string(record, 'email'))
+    validate_email(email)
+    user = User(
+        email=email,
+        mobile_number=_get_string(record, 'mobile_number')
+    )
+    password_hash = _get_string(record, 'password_hash')
+    password = None
+    if password_hash:
+        try:
+            identify_hasher(password_hash)
+        except ValueError:
+            raise ValidationError('Unknown password hash format.')
+        user.password = password_hash
+    else:
+        password = _get_string(record, 'password')
+        if not password:
+            raise ValidationError(
+                'Either password or password_hash is required.'
+            )
+    _check_max_length(user)
+    return user, password
+
+
+def _import_user_batch(batch):
+    """
+    Creates users for a batch of (line number, record) pairs.
+
+    Returns the number of users created and a list of (line number,
+    error) pairs for the records that were skipped.
+    """
+    users = []
+    errors = []
+    emails = set()
+    for line_number, record in batch:
+        try:
+            user, password = _make_user(record)
+        except ValidationError as error:
+            errors.append((line_number, ' '.join(error.messages)))
+            continue
+        if user.email in emails:
+            errors.append((line_number, 'Duplicate email address.'))
+            continue
+        emails.add(user.email)
+        users.append((line_number, user, password))
+    existing = set(
+        User.objects.filter(email__in=emails).values_list('email', flat=True)
+    )
+    new_users = []
+    to_hash = []
+    for line_number, user, password in users:
+        if user.email in existing:
+            errors.append((line_number, 'User already exists.'))
+            continue
+        new_users.append((line_number, user))
+        if password is not None:
+            to_hash.append((user, password))
+    # Passwords are hashed in parallel by the password hashing workers.
+    hashes = make_passwords([password for user, password in to_hash])
+    for (user, password), password_hash in zip(to_hash, hashes):
+        user.password = password_hash
+    # Users who sign up while the batch is being prepared are skipped by
+    # the database. Each user created by this batch has the password
+    # hash set above, which tells them apart from those users.
+    User.objects.bulk_create(
+        [user for line_number, user in new_users],
+        ignore_conflicts=True
+    )
+    created = set(
+        User.objects.filter(
+            email__in=[user.email for line_number, user in new_users]
+        ).values_list('email', 'password')
+    )
+    count = 0
+    for line_number, user in new_users:
+        if (user.email, user.password) in created:
+            count += 1
+        else:
+            errors.append((line_number, 'User already exists.'))
+    errors.sort()
+    return count, errors
+
+
+def import_users(records, batch_size=1000):
+    """
+    Creates users from (line number, record) pairs, such as those
+    yielded by read_users().
+
+    Each record has an email address, an optional mobile number, and
+    either a password or a password_hash made by one of the
+    PASSWORD_HASHERS. Users are created in batches of batch_size, each
+    in a single query. Records that are invalid, or whose email address
+    is already taken, are skipped.
+
+    Yields the number of users created and the skipped records (as
+    line number and error pairs) for each batch.
+    """
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield _import_user_batch(batch)
+
+
+def export_users(f, file_format, chunk_size=2000):
+    """
+    Writes every user to a file in the format read by read_users().
+
+    Users are read from the database in chunks of chunk_size, so memory
+    use doesn't grow with the number of users. Returns the number of
+    users written.
+    """
+    users = User.objects.order_by('pk').values_list(
+        'email',
+        'password',
+        'mobile_number'
+    ).iterator(chunk_size=chunk_size)
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(USER_FILE_FIELDS)
+        for count, user in enumerate(users, 1):
+            writer.writerow(user)
+    else:
+        for count, user in enumerate(users, 1):
+            f.write(json.dumps(dict(zip(USER_FILE_FIELDS, user))) + '\n')
+    return count
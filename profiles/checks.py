@@ -0,0 +1,53 @@
+"""
+Defines system checks for the settings used by the profiles app.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Session engines that store sessions in the cache.
+CACHED_SESSION_ENGINES = (
+    'profiles.sessions',
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def _is_local_cache(alias):
+    return settings.CACHES[alias]['BACKEND'] == LOCAL_CACHE_BACKEND
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Ensures that sessions and users are only cached in a cache that is
+    shared by every process.
+
+    Each process has its own in-memory cache, so logging out or changing
+    a password in one process wouldn't end the session in the others.
+    """
+    errors = []
+    if (settings.SESSION_ENGINE in CACHED_SESSION_ENGINES
+            and _is_local_cache(settings.SESSION_CACHE_ALIAS)):
+        errors.append(Error(
+            'Sessions are stored in an in-memory cache that each process '
+            'has its own copy of.',
+            hint=(
+                'Set REDIS_URL to use a shared cache, or set '
+                'DJANGO_SESSION_MODE to db.'
+            ),
+            id='profiles.E001',
+        ))
+    if settings.USER_CACHE is not None and _is_local_cache(
+            settings.USER_CACHE):
+        errors.append(Error(
+            'Users are cached in an in-memory cache that each process '
+            'has its own copy of.',
+            hint='Set REDIS_URL to use a shared cache, or set USER_CACHE '
+                 'to None.',
+            id='profiles.E002',
+        ))
+    return errors
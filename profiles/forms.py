@@ -41,6 +41,29 @@ def validate_secret_key(value):
         raise ValidationError('That\'s not the secret sauce.')
 
 
+def clean_passwords(form, cleaned_data):
+    """
+    Ensures that the password fields match, then validates the password.
+
+    The password validators are only run once, however many fields the
+    password was entered in.
+    """
+    password = cleaned_data.get('password')
+    confirm_password = cleaned_data.get('confirm_password')
+    if password is None or confirm_password is None:
+        return
+    if password != confirm_password:
+        form.add_error(
+            'password',
+            ValidationError('Passwords do not match.')
+        )
+        return
+    try:
+        validate_password(password)
+    except ValidationError as error:
+        form.add_error('password', error)
+
+
 class CreateUserForm(forms.Form):
 
     email = forms.EmailField(
@@ -63,7 +86,6 @@ class CreateUserForm(forms.Form):
     )
     password = forms.CharField(
         label='',
-        validators=[validate_password],
         widget=forms.PasswordInput(
             attrs={
                 'class': 'form-control',
@@ -73,7 +95,6 @@ class CreateUserForm(forms.Form):
     )
     confirm_password = forms.CharField(
         label='',
-        validators=[validate_password],
         widget=forms.PasswordInput(
             attrs={
                 'class': 'form-control',
@@ -94,16 +115,10 @@ class CreateUserForm(forms.Form):
 
     def clean(self):
         """
-        Ensures that passwords match.
+        Ensures that passwords match and are strong enough.
         """
         cleaned_data = super().clean()
-        password = cleaned_data.get('password')
-        confirm_password = cleaned_data.get('confirm_password')
-        if password != confirm_password:
-            self.add_error(
-                'password',
-                ValidationError('Passwords do not match.')
-            )
+        clean_passwords(self, cleaned_data)
 
 
 class MobileNumberForm(forms.Form):
@@ -205,7 +220,6 @@ class ResetPasswordForm(forms.Form):
 
     password = forms.CharField(
         label='',
-        validators=[validate_password],
         widget=forms.PasswordInput(
             attrs={
                 'class': 'form-control',
@@ -215,7 +229,6 @@ class ResetPasswordForm(forms.Form):
     )
     confirm_password = forms.CharField(
         label='',
-        validators=[validate_password],
         widget=forms.PasswordInput(
             attrs={
                 'class': 'form-control',
@@ -226,13 +239,7 @@ class ResetPasswordForm(forms.Form):
 
     def clean(self):
         """
-        Ensures that passwords match.
+        Ensures that passwords match and are strong enough.
         """
         cleaned_data = super().clean()
-        password = cleaned_data.get('password')
-        confirm_password = cleaned_data.get('confirm_password')
-        if password != confirm_password:
-            self.add_error(
-                'password',
-                ValidationError('Passwords do not match.')
-            )
+        clean_passwords(self, cleaned_data)
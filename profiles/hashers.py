@@ -0,0 +1,164 @@
+"""
+Defines functions for hashing passwords and short-lived tokens.
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import (
+    constant_time_compare, get_random_string, salted_hmac
+)
+
+from profiles.instrumentation import add_timing, timed
+
+
+TOKEN_HASH_ALGORITHM = 'hmac_sha256'
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the executor that passwords are hashed in.
+
+    PASSWORD_HASHING_EXECUTOR selects a pool of threads or processes.
+    The default PBKDF2 hasher uses hashlib, which releases the GIL, so
+    threads are enough to spread it across cores; a process pool suits
+    hashers that hold the GIL.
+    """
+    global _executor
+    if _executor is None:
+        max_workers = settings.PASSWORD_HASHING_WORKERS
+        if settings.PASSWORD_HASHING_EXECUTOR == 'thread':
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='password-hasher'
+            )
+        elif settings.PASSWORD_HASHING_EXECUTOR == 'process':
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=django.setup
+            )
+        else:
+            raise ImproperlyConfigured(
+                'PASSWORD_HASHING_EXECUTOR must be thread or process'
+            )
+    return _executor
+
+
+def _call_timed(func, *args):
+    """
+    Calls the function, returning its result and how long it took.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+async def _run_in_executor(func, *args):
+    """
+    Runs the function in the hashing executor.
+
+    The time spent hashing and the time spent waiting for a free worker
+    are added to the hash and hash-wait stages of the current request.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    result, duration = await loop.run_in_executor(
+        get_executor(),
+        functools.partial(_call_timed, func, *args)
+    )
+    add_timing('hash', duration)
+    add_timing('hash-wait', time.perf_counter() - start - duration)
+    return result
+
+
+def make_password(password, salt=None, hasher='default'):
+    """
+    Hashes a password, adding the time taken to the current request.
+    """
+    with timed('hash'):
+        return hashers.make_password(password, salt, hasher)
+
+
+def check_password(password, encoded, setter=None, preferred='default'):
+    """
+    Checks a password, adding the time taken to the current request.
+    """
+    with timed('hash'):
+        return hashers.check_password(password, encoded, setter, preferred)
+
+
+def make_passwords(passwords):
+    """
+    Hashes several passwords at once, spread across the hashing workers.
+
+    Returns the hashes in the same order as the passwords.
+    """
+    with timed('hash'):
+        return list(get_executor().map(hashers.make_password, passwords))
+
+
+async def amake_password(password, salt=None, hasher='default'):
+    """
+    Hashes a password without blocking the event loop.
+
+    Takes the same arguments as django.contrib.auth.hashers.make_password().
+    """
+    return await _run_in_executor(
+        hashers.make_password,
+        password,
+        salt,
+        hasher
+    )
+
+
+async def acheck_password(password, encoded, setter=None,
+                          preferred='default'):
+    """
+    Checks a password without blocking the event loop.
+
+    Takes the same arguments as django.contrib.auth.hashers.check_password(),
+    except that the setter must be a coroutine function.
+    """
+    is_correct, must_update = await _run_in_executor(
+        hashers.verify_password,
+        password,
+        encoded,
+        preferred
+    )
+    if setter and is_correct and must_update:
+        await setter(password)
+    return is_correct
+
+
+def make_token_hash(token, salt=None):
+    """
+    Returns a keyed hash of a short-lived token, such as an SMS code.
+
+    These tokens expire quickly and can only be guessed a few times, so
+    a single HMAC keyed with SECRET_KEY is used instead of a slow
+    password hasher.
+    """
+    if salt is None:
+        salt = get_random_string(12)
+    digest = salted_hmac(salt, token, algorithm='sha256').hexdigest()
+    return '{0}${1}${2}'.format(TOKEN_HASH_ALGORITHM, salt, digest)
+
+
+def check_token_hash(token, encoded):
+    """
+    Returns True if the token matches the encoded hash.
+    """
+    algorithm, _, remainder = encoded.partition('$')
+    if algorithm != TOKEN_HASH_ALGORITHM:
+        # Tokens hashed with a password hasher before this existed.
+        return check_password(token, encoded)
+    salt, _, digest = remainder.partition('$')
+    return constant_time_compare(make_token_hash(token, salt), encoded)
@@ -0,0 +1,187 @@
+"""
+Defines tools for timing the stages of each request.
+
+The time spent querying the database, rendering templates, hashing
+passwords (and waiting for a hashing worker), sending SMS messages and
+queueing emails is recorded for the current request, reported in its
+Server-Timing header and added to a histogram kept by each process.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends import django as django_backend
+from django.template.exceptions import TemplateDoesNotExist
+
+
+# Upper bounds of the histogram buckets, in milliseconds.
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_current_timings = contextvars.ContextVar('timings', default=None)
+
+
+class Timings:
+    """
+    Records how long each stage of a request took.
+
+    Stages can overlap; for example, a template that queries the
+    database adds to both the template and database times.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, stage, seconds):
+        self.durations[stage] += seconds
+        self.counts[stage] += 1
+
+    def get_total(self):
+        return time.perf_counter() - self.start
+
+    def get_server_timing(self, total):
+        """
+        Returns the value of the Server-Timing header.
+        """
+        metrics = [
+            '{0};dur={1:.2f};desc="calls={2}"'.format(
+                stage,
+                seconds * 1000,
+                self.counts[stage]
+            )
+            for stage, seconds in self.durations.items()
+        ]
+        metrics.append('total;dur={0:.2f}'.format(total * 1000))
+        return ', '.join(metrics)
+
+
+def start_timings():
+    """
+    Starts recording timings for the current request.
+
+    Returns the Timings object, and the token used to stop recording.
+    """
+    timings = Timings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_timings(token):
+    _current_timings.reset(token)
+
+
+def add_timing(stage, seconds):
+    """
+    Adds a duration measured elsewhere, such as in a worker thread or
+    process, to the given stage of the current request.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """
+    Adds the time taken by the block to the given stage of the current
+    request, if one is being timed.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+
+def _time_query(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Django template backend that times how long templates take to render.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class Histogram:
+    """
+    Counts how long each stage of each view took, in buckets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, view_name, timings, total):
+        durations = dict(timings.durations, total=total)
+        with self._lock:
+            for stage, seconds in durations.items():
+                key = (view_name, stage)
+                if key not in self._stages:
+                    self._stages[key] = {
+                        'buckets': [0] * (len(HISTOGRAM_BUCKETS) + 1),
+                        'count': 0,
+                        'total': 0.0,
+                    }
+                stats = self._stages[key]
+                milliseconds = seconds * 1000
+                index = bisect.bisect_left(HISTOGRAM_BUCKETS, milliseconds)
+                stats['buckets'][index] += 1
+                stats['count'] += 1
+                stats['total'] += milliseconds
+
+    def get_summary(self):
+        """
+        Returns the number of requests in each bucket, and the mean time
+        in milliseconds, for each stage of each view.
+        """
+        bounds = [str(bound) for bound in HISTOGRAM_BUCKETS] + ['+Inf']
+        summary = defaultdict(dict)
+        with self._lock:
+            for (view_name, stage), stats in self._stages.items():
+                summary[view_name][stage] = {
+                    'count': stats['count'],
+                    'mean_ms': round(stats['total'] / stats['count'], 3),
+                    'buckets': dict(zip(bounds, stats['buckets'])),
+                }
+        return dict(summary)
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+histogram = Histogram()
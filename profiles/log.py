@@ -0,0 +1,134 @@
+"""
+Defines logging handlers, filters and formatters used by the project.
+
+Records are put on a queue by the thread that logs them and written by
+a background thread, so logging never waits on the output stream.
+"""
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+
+_current_request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes that every log record has. Anything else on a record was
+# passed in the extra argument, and is added to its JSON.
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord('', 0, '', 0, '', (), None).__dict__
+) | {'message', 'asctime', 'request_id'}
+
+
+def set_request_id(request_id):
+    """
+    Sets the ID added to records logged while handling the current
+    request. Returns the token used to reset it.
+    """
+    return _current_request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _current_request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the ID of the current request to each record.
+    """
+
+    def filter(self, record):
+        record.request_id = _current_request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a random sample of records below the given level.
+
+    Use it on loggers that log an event for every request, so that a
+    busy site doesn't spend its time writing logs. Records at or above
+    the level are always let through.
+    """
+
+    def __init__(self, rate=1.0, level=logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        if isinstance(level, str):
+            level = logging.getLevelName(level)
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno >= self.level or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a single line of JSON.
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created,
+                tz=datetime.timezone.utc
+            ).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background thread, which writes them to a stream
+    (standard error by default).
+
+    The handler's formatter is used by the background thread, so the
+    cost of formatting records isn't paid by the thread logging them.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream)
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self._stop_listener)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Returns a copy of the record that is safe to format later.
+
+        The message is merged with its arguments straight away, in case
+        the arguments change before the record is formatted.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def _stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        self.target.close()
+        super().close()
@@ -0,0 +1,57 @@
+"""
+Builds the file of breached passwords read by BreachedPasswordValidator.
+"""
+
+from django.core.management.base import BaseCommand
+
+from profiles.utils import build_breached_password_file
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Sorts a list of breached passwords into the file read by '
+        'BreachedPasswordValidator.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='Text file with one password per line.'
+        )
+        parser.add_argument(
+            'output',
+            help='File to write the sorted password digests to.'
+        )
+        parser.add_argument(
+            '--hashed',
+            action='store_true',
+            help=(
+                'Each line of the input is a hexadecimal SHA-1 digest, '
+                'optionally followed by a colon and a count.'
+            )
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000000,
+            help='Maximum number of passwords sorted in memory at once.'
+        )
+
+    def handle(self, *args, **options):
+        count, skipped = build_breached_password_file(
+            options['input'],
+            options['output'],
+            hashed=options['hashed'],
+            chunk_size=options['chunk_size']
+        )
+        for line_number in skipped:
+            self.stderr.write(
+                'Skipped line {0}: not a SHA-1 digest.'.format(line_number)
+            )
+        self.stdout.write(
+            'Wrote {0} breached passwords to {1}.'.format(
+                count,
+                options['output']
+            )
+        )
@@ -0,0 +1,54 @@
+"""
+Writes every user to a CSV or JSON Lines file.
+"""
+
+from django.core.management.base import BaseCommand
+
+from profiles.bulk import export_users
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Writes the email, password hash and mobile number of every user '
+        'in the format read by import_users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='File to write users to. Defaults to standard output.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Format of the file. Guessed from its extension if omitted.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of users read from the database at once.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if path.endswith('.csv') else 'jsonl'
+        if path == '-':
+            count = export_users(
+                self.stdout,
+                file_format,
+                chunk_size=options['chunk_size']
+            )
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                count = export_users(
+                    f,
+                    file_format,
+                    chunk_size=options['chunk_size']
+                )
+            self.stdout.write('Exported {0} users.'.format(count))
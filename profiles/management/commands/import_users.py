@@ -0,0 +1,62 @@
+"""
+Creates users from a CSV or JSON Lines file.
+"""
+
+import contextlib
+import sys
+
+from django.core.management.base import BaseCommand
+
+from profiles.bulk import import_users, read_users
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Creates users from a CSV file with a header row, or a JSON Lines '
+        'file. Each user needs an email and either a password or a '
+        'password_hash, and can have a mobile_number.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='File to read users from, or - for standard input.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Format of the file. Guessed from its extension if omitted.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users created in each query.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if path.endswith('.csv') else 'jsonl'
+        if path == '-':
+            f = contextlib.nullcontext(sys.stdin)
+        else:
+            f = open(path, newline='', encoding='utf-8')
+        created = skipped = 0
+        with f as lines:
+            for count, errors in import_users(
+                read_users(lines, file_format),
+                batch_size=options['batch_size']
+            ):
+                created += count
+                skipped += len(errors)
+                for line_number, error in errors:
+                    self.stderr.write(
+                        'Skipped line {0}: {1}'.format(line_number, error)
+                    )
+                self.stdout.write('Created {0} users...'.format(created))
+        self.stdout.write(
+            'Created {0} users and skipped {1}.'.format(created, skipped)
+        )
@@ -0,0 +1,40 @@
+"""
+Deletes expired phone, email and reset password tokens.
+"""
+
+from django.core.management.base import BaseCommand
+
+from profiles.utils import purge_expired_tokens
+
+
+class Command(BaseCommand):
+
+    help = 'Deletes tokens that have expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Maximum number of rows deleted in each transaction.'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to wait between chunks.'
+        )
+
+    def handle(self, *args, **options):
+        results = purge_expired_tokens(
+            chunk_size=options['chunk_size'],
+            pause=options['pause']
+        )
+        for model_name, (deleted, seconds) in results.items():
+            self.stdout.write(
+                'Deleted {0} {1} objects in {2:.2f}s.'.format(
+                    deleted,
+                    model_name,
+                    seconds
+                )
+            )
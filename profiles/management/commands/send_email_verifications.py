@@ -0,0 +1,81 @@
+"""
+Asks users to verify their email addresses again.
+"""
+
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from drivers.mail import get_queue
+from drivers.queues.database import MailQueue as DatabaseMailQueue
+from profiles.verification import send_email_verifications
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Sends every user (or the users with the given email addresses) '
+        'a new email verification link.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails',
+            nargs='*',
+            help='Only send links to these email addresses.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of emails sent over each connection.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'File used to record progress, so that an interrupted '
+                'run carries on where it stopped. Defaults to a file '
+                'named after the email addresses given.'
+            )
+        )
+
+    def get_checkpoint_path(self, emails):
+        """
+        Returns the default checkpoint file for the given email
+        addresses, so that runs for different users don't share one.
+        """
+        if not emails:
+            return 'email_verifications.checkpoint'
+        digest = hashlib.sha256(
+            '\n'.join(sorted(set(emails))).encode()
+        ).hexdigest()
+        return 'email_verifications-{0}.checkpoint'.format(digest[:16])
+
+    def handle(self, *args, **options):
+        # Emails that can't be sent are queued to be retried, which the
+        # in-memory queue can't do once this command exits.
+        if not isinstance(get_queue(), DatabaseMailQueue):
+            raise CommandError(
+                'EMAIL_QUEUE_BACKEND must be '
+                'drivers.queues.database.MailQueue, so that emails that '
+                "can't be sent are retried after this command exits."
+            )
+        users = User.objects.all()
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+        checkpoint_path = options['checkpoint']
+        if checkpoint_path is None:
+            checkpoint_path = self.get_checkpoint_path(options['emails'])
+        sent = 0
+        for count in send_email_verifications(
+            users,
+            batch_size=options['batch_size'],
+            checkpoint_path=checkpoint_path
+        ):
+            sent += count
+            self.stdout.write('Sent {0} emails...'.format(sent))
+        self.stdout.write('Sent {0} emails.'.format(sent))
@@ -0,0 +1,87 @@
+"""
+Defines middleware used by the project.
+"""
+
+import logging
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from profiles.instrumentation import histogram, start_timings, stop_timings
+from profiles.log import reset_request_id, set_request_id
+
+
+logger = logging.getLogger('profiles.requests')
+
+
+class TimingMiddleware:
+    """
+    Times the stages of each request and gives each request an ID.
+
+    The timings are added to the histogram and logged along with the
+    request ID, which is also added to every other record logged while
+    handling the request. If SERVER_TIMING is True, the timings are sent
+    to the client in a Server-Timing header. This should be the first
+    middleware so that it times everything else.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = start_timings()
+        request_id_token = set_request_id(uuid.uuid4().hex)
+        try:
+            response = self.get_response(request)
+            return self._record(request, response, timings)
+        finally:
+            reset_request_id(request_id_token)
+            stop_timings(token)
+
+    async def __acall__(self, request):
+        timings, token = start_timings()
+        request_id_token = set_request_id(uuid.uuid4().hex)
+        try:
+            response = await self.get_response(request)
+            return self._record(request, response, timings)
+        finally:
+            reset_request_id(request_id_token)
+            stop_timings(token)
+
+    def _record(self, request, response, timings):
+        total = timings.get_total()
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        else:
+            view_name = 'unresolved'
+        histogram.record(view_name, timings, total)
+        # The view name is logged instead of the path, which can contain
+        # email verification and reset password tokens.
+        logger.info(
+            '%s %s %s',
+            request.method,
+            view_name,
+            response.status_code,
+            extra={
+                'timings': {
+                    stage: round(seconds * 1000, 3)
+                    for stage, seconds in dict(
+                        timings.durations,
+                        total=total
+                    ).items()
+                },
+            }
+        )
+        if settings.SERVER_TIMING:
+            response.headers['Server-Timing'] = timings.get_server_timing(
+                total
+            )
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_remove_user_first_name_remove_user_last_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailtoken',
+            name='selector',
+            field=models.CharField(max_length=12, null=True, unique=True),
+        ),
+    ]
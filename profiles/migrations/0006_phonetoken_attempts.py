@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_resetpasswordtoken_selector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phonetoken',
+            name='attempts',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
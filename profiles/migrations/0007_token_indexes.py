@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_phonetoken_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='emailtoken',
+            options={'get_latest_by': 'datetime', 'ordering': ['datetime']},
+        ),
+        migrations.AlterModelOptions(
+            name='phonetoken',
+            options={'get_latest_by': 'datetime', 'ordering': ['datetime']},
+        ),
+        migrations.AlterModelOptions(
+            name='resetpasswordtoken',
+            options={'get_latest_by': 'datetime', 'ordering': ['datetime']},
+        ),
+        migrations.AddIndex(
+            model_name='emailtoken',
+            index=models.Index(fields=['user', 'datetime'], name='profiles_em_user_id_0ea722_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailtoken',
+            index=models.Index(fields=['datetime'], name='profiles_em_datetim_fd2b73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonetoken',
+            index=models.Index(fields=['user', 'datetime'], name='profiles_ph_user_id_140ac3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonetoken',
+            index=models.Index(fields=['datetime'], name='profiles_ph_datetim_758b16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resetpasswordtoken',
+            index=models.Index(fields=['user', 'datetime'], name='profiles_re_user_id_cf64db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resetpasswordtoken',
+            index=models.Index(fields=['datetime'], name='profiles_re_datetim_d174e2_idx'),
+        ),
+    ]
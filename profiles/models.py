@@ -3,19 +3,76 @@ Defines models that are used to create and manage user accounts.
 """
 
 import datetime
+import functools
 import secrets
 import string
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, UserManager
-from django.contrib.auth.hashers import check_password, make_password
-from django.db import models
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.autoreload import get_template_directories
+from django.template.loader import get_template
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.autoreload import file_changed
 
-from drivers import send_sms_message
+from drivers import (
+    aqueue_mail, asend_sms_message, queue_mail, send_sms_message
+)
+from profiles.hashers import (
+    acheck_password, amake_password, check_password, check_token_hash,
+    make_password, make_passwords, make_token_hash
+)
+from profiles.instrumentation import timed
+
+
+# Number of leading characters of an email or password reset token
+# that are stored in plain text and used to look up the token.
+TOKEN_SELECTOR_LENGTH = 12
+
+# Length of time for which a token remains valid after being created.
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+
+# Number of times a user can try to enter an SMS code.
+MAX_SMS_TOKEN_ATTEMPTS = 5
+
+
+@functools.cache
+def get_email_template(template_name):
+    """
+    Returns the compiled email template with the given name.
+
+    Each email template is looked up and compiled the first time it's
+    used, then reused for every email sent by this process. Under
+    runserver, the templates are compiled again after a template file
+    changes.
+    """
+    return get_template(template_name)
+
+
+@receiver(setting_changed)
+def reset_email_templates(*, setting, **kwargs):
+    if setting == 'TEMPLATES':
+        get_email_template.cache_clear()
+
+
+@receiver(file_changed)
+def reset_changed_email_templates(sender, file_path, **kwargs):
+    # Mirrors django.template.autoreload.template_changed(), which
+    # resets the cached template loader but not this cache. Returning
+    # None leaves it to that receiver to decide whether to restart.
+    if file_path.suffix == '.py':
+        return
+    for template_dir in get_template_directories():
+        if template_dir in file_path.parents:
+            get_email_template.cache_clear()
+            return
 
 
 class User(AbstractBaseUser):
@@ -27,6 +84,26 @@ class User(AbstractBaseUser):
 
     objects = UserManager()
 
+    async def aset_password(self, raw_password):
+        """
+        Sets the user's password without blocking the event loop.
+        """
+        self.password = await amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        """
+        Checks the user's password without blocking the event loop.
+        """
+        async def setter(raw_password):
+            await self.aset_password(raw_password)
+            # Password hash upgrades shouldn't be considered password
+            # changes.
+            self._password = None
+            await self.asave(update_fields=['password'])
+
+        return await acheck_password(raw_password, self.password, setter)
+
     def add_new_mobile_number(self, mobile_number):
         """
         Creates a new PhoneToken object and sends SMS code.
@@ -37,24 +114,55 @@ class User(AbstractBaseUser):
         )
         token_object.save()
 
+    async def aadd_new_mobile_number(self, mobile_number):
+        """
+        Creates a new PhoneToken object and sends SMS code.
+        """
+        token_object = PhoneToken(
+            phone=mobile_number,
+            user=self
+        )
+        await token_object.asave()
+
     def check_sms_token(self, sms_token):
         """
         Checks that the code submitted by the user is correct.
         """
         phonetoken_object = self.phonetoken_set.last()
-        if phonetoken_object.is_current():
-            is_valid = check_password(
-                sms_token,
-                phonetoken_object.token
-            )
-            if is_valid:
-                user = phonetoken_object.user
-                mobile_number = phonetoken_object.phone
-                user.mobile_number = mobile_number
-                user.save()
-                return True
-        else:
+        if phonetoken_object is None or not phonetoken_object.is_current():
+            return False
+        # Count this attempt before checking the code, so that
+        # concurrent requests can't make more guesses than allowed.
+        attempt_allowed = PhoneToken.objects.filter(
+            pk=phonetoken_object.pk,
+            attempts__lt=MAX_SMS_TOKEN_ATTEMPTS
+        ).update(attempts=F('attempts') + 1)
+        if not attempt_allowed:
             return False
+        if check_token_hash(sms_token, phonetoken_object.token):
+            self.mobile_number = phonetoken_object.phone
+            self.save()
+            return True
+        return False
+
+    async def acheck_sms_token(self, sms_token):
+        """
+        Checks that the code submitted by the user is correct.
+        """
+        phonetoken_object = await self.phonetoken_set.alast()
+        if phonetoken_object is None or not phonetoken_object.is_current():
+            return False
+        attempt_allowed = await PhoneToken.objects.filter(
+            pk=phonetoken_object.pk,
+            attempts__lt=MAX_SMS_TOKEN_ATTEMPTS
+        ).aupdate(attempts=F('attempts') + 1)
+        if not attempt_allowed:
+            return False
+        if check_token_hash(sms_token, phonetoken_object.token):
+            self.mobile_number = phonetoken_object.phone
+            await self.asave()
+            return True
+        return False
 
     def create_email_token(self):
         """
@@ -66,6 +174,16 @@ class User(AbstractBaseUser):
         )
         token_object.save()
 
+    async def acreate_email_token(self):
+        """
+        Creates an EmailToken object and sends a verification link.
+        """
+        token_object = EmailToken(
+            email=self.email,
+            user=self
+        )
+        await token_object.asave()
+
     async def send_reset_password_email(self):
         """
         Creates a ResetPasswordToken object and sends an email.
@@ -74,12 +192,62 @@ class User(AbstractBaseUser):
         await token_object.asave()
 
 
+def get_user_version_key(user_id):
+    """
+    Returns the key of the version that is bumped whenever the user
+    with the given ID is saved or deleted.
+    """
+    return 'user-version:{0}'.format(user_id)
+
+
+def new_user_version():
+    """
+    Returns a version for a user with no version in the cache.
+
+    Versions start at a random number, so that users cached under an
+    evicted version are never read again.
+    """
+    return secrets.randbits(48)
+
+
+def get_user_cache_key(user_id, version):
+    """
+    Returns the key used to cache a version of the user with the given
+    ID.
+    """
+    return 'user:{0}:{1}'.format(user_id, version)
+
+
+@receiver([post_save, post_delete], sender=User)
+def clear_cached_user(sender, instance, **kwargs):
+    # Bumping the version, rather than deleting the cached user, stops
+    # a request that read the user before this change from caching it
+    # afterwards under the current key.
+    if settings.USER_CACHE is not None:
+        try:
+            caches[settings.USER_CACHE].incr(
+                get_user_version_key(instance.pk)
+            )
+        except ValueError:
+            # The next request starts a new version.
+            pass
+
+
 class PhoneToken(models.Model):
 
     token = models.CharField(max_length=256)
     phone = models.CharField(max_length=12)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     datetime = models.DateTimeField(auto_now_add=True)
+    attempts = models.SmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['datetime']
+        get_latest_by = 'datetime'
+        indexes = [
+            models.Index(fields=['user', 'datetime']),
+            models.Index(fields=['datetime']),
+        ]
 
     def _generate_token(self):
         """
@@ -96,50 +264,172 @@ class PhoneToken(models.Model):
         Sends an SMS message to the given phone number with the token.
         """
         sms_message = 'Your mobile verification code is {0}.'
-        send_sms_message(
-            sms_message.format(token),
-            mobile_number
-        )
+        with timed('sms'):
+            send_sms_message(
+                sms_message.format(token),
+                mobile_number
+            )
+
+    async def _asend_sms_message(self, token, mobile_number):
+        """
+        Sends an SMS message to the given phone number with the token.
+        """
+        sms_message = 'Your mobile verification code is {0}.'
+        with timed('sms'):
+            await asend_sms_message(
+                sms_message.format(token),
+                mobile_number
+            )
 
     def save(self, *args, **kwargs):
         token = self._generate_token()
-        self.token = make_password(token)
+        self.token = make_token_hash(token)
         self._send_sms_message(token, self.phone)
         models.Model.save(self, *args, **kwargs)
 
+    async def asave(self, *args, **kwargs):
+        token = self._generate_token()
+        self.token = make_token_hash(token)
+        await self._asend_sms_message(token, self.phone)
+        # Model.asave() would call the save() method defined above.
+        await sync_to_async(models.Model.save)(self, *args, **kwargs)
+
     def is_current(self):
         """
         Returns True if email token was created less than 1 hour ago.
         """
         time_difference = timezone.now() - self.datetime
-        one_hour = datetime.timedelta(hours=1)
-        return one_hour > time_difference
+        return TOKEN_LIFETIME > time_difference
 
 
 class CustomEmailTokenManager(models.Manager):
 
+    def current(self):
+        """
+        Returns the tokens that haven't expired yet.
+        """
+        return self.filter(datetime__gt=timezone.now() - TOKEN_LIFETIME)
+
     def check_token(self, token):
         """
         Checks to see whether the given token exists.
+
+        The first part of the token (the selector) is used to find the
+        token object, and the rest of the token (the verifier) is then
+        checked against the hash stored in the database.
         """
-        email_token_objects = self.all()
-        token_exists = False
-        for email_token_object in email_token_objects:
-            token_exists = check_password(
-                token,
-                email_token_object.token
+        selector = token[:TOKEN_SELECTOR_LENGTH]
+        verifier = token[TOKEN_SELECTOR_LENGTH:]
+        try:
+            email_token_object = self.select_related('user').get(
+                selector=selector
+            )
+        except EmailToken.DoesNotExist:
+            return self._check_legacy_token(token)
+        if not check_password(verifier, email_token_object.token):
+            raise EmailToken.DoesNotExist
+        self._verify_email_address(email_token_object)
+        return email_token_object
+
+    async def acheck_token(self, token):
+        """
+        Checks to see whether the given token exists.
+        """
+        selector = token[:TOKEN_SELECTOR_LENGTH]
+        verifier = token[TOKEN_SELECTOR_LENGTH:]
+        try:
+            email_token_object = await self.select_related('user').aget(
+                selector=selector
             )
-            if token_exists:
-                user = email_token_object.user
-                email_address = email_token_object.email
-                user.email = email_address
-                user.save()
+        except EmailToken.DoesNotExist:
+            return await self._acheck_legacy_token(token)
+        if not await acheck_password(verifier, email_token_object.token):
+            raise EmailToken.DoesNotExist
+        await self._averify_email_address(email_token_object)
+        return email_token_object
+
+    def _check_legacy_token(self, token):
+        """
+        Checks the given token against tokens created without a selector.
+
+        These tokens hash the entire token, so each one has to be
+        checked in turn. No new tokens of this kind are created, and
+        only those that haven't expired are checked, so that a wrong
+        token can't make the server hash every one ever created.
+        """
+        email_token_objects = self.current().select_related('user').filter(
+            selector__isnull=True
+        )
+        for email_token_object in email_token_objects:
+            if check_password(token, email_token_object.token):
+                self._verify_email_address(email_token_object)
                 return email_token_object
         raise EmailToken.DoesNotExist
 
+    async def _acheck_legacy_token(self, token):
+        """
+        Checks the given token against tokens created without a selector.
+        """
+        email_token_objects = self.current().select_related('user').filter(
+            selector__isnull=True
+        )
+        async for email_token_object in email_token_objects:
+            if await acheck_password(token, email_token_object.token):
+                await self._averify_email_address(email_token_object)
+                return email_token_object
+        raise EmailToken.DoesNotExist
+
+    def create_tokens(self, users):
+        """
+        Replaces the email tokens of the given users, without sending any
+        emails.
+
+        The tokens are hashed in parallel and inserted in one query.
+        Returns a list of (user, token) pairs.
+        """
+        tokens = [self.model()._generate_token() for user in users]
+        hashes = make_passwords(
+            [token[TOKEN_SELECTOR_LENGTH:] for token in tokens]
+        )
+        with transaction.atomic():
+            self.filter(
+                Q(user__in=users) | Q(email__in=[user.email for user in users])
+            ).delete()
+            self.bulk_create([
+                self.model(
+                    selector=token[:TOKEN_SELECTOR_LENGTH],
+                    token=token_hash,
+                    email=user.email,
+                    user=user
+                )
+                for user, token, token_hash in zip(users, tokens, hashes)
+            ])
+        return list(zip(users, tokens))
+
+    def _verify_email_address(self, email_token_object):
+        """
+        Updates the user's email address to the one that was verified.
+        """
+        user = email_token_object.user
+        user.email = email_token_object.email
+        user.save()
+
+    async def _averify_email_address(self, email_token_object):
+        """
+        Updates the user's email address to the one that was verified.
+        """
+        user = email_token_object.user
+        user.email = email_token_object.email
+        await user.asave()
+
 
 class EmailToken(models.Model):
 
+    selector = models.CharField(
+        max_length=TOKEN_SELECTOR_LENGTH,
+        unique=True,
+        null=True
+    )
     token = models.CharField(max_length=256)
     email = models.EmailField(unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -147,6 +437,14 @@ class EmailToken(models.Model):
 
     objects = CustomEmailTokenManager()
 
+    class Meta:
+        ordering = ['datetime']
+        get_latest_by = 'datetime'
+        indexes = [
+            models.Index(fields=['user', 'datetime']),
+            models.Index(fields=['datetime']),
+        ]
+
     def _generate_token(self):
         """
         Creates a unique 32-character string.
@@ -159,9 +457,9 @@ class EmailToken(models.Model):
             )
         return token
 
-    def _send_email(self, token, email_address):
+    def _get_email_content(self, token):
         """
-        Sends a verification link to a user via email.
+        Returns the text and HTML content of the verification email.
         """
         # First, determine the URL for the verification link.
         verification_url = reverse(
@@ -183,62 +481,171 @@ class EmailToken(models.Model):
             'domain': settings.DOMAIN,
             'path': verification_url,
         }
-        html_email_message = render_to_string(
-            'email_verification.html',
-            template_context
-        )
-        # Finally, send the email.
-        send_mail(
-            'Verify Email Address',
-            text_email_message,
-            'noreply@{0}'.format(settings.DOMAIN),
-            [email_address],
-            fail_silently=False,
-            html_message=html_email_message
+        html_email_message = get_email_template(
+            'email_verification.html'
+        ).render(template_context)
+        return text_email_message, html_email_message
+
+    def _send_email(self, token, email_address):
+        """
+        Sends a verification link to a user via email.
+        """
+        text_email_message, html_email_message = self._get_email_content(
+            token
         )
+        with timed('mail-enqueue'):
+            queue_mail(
+                'Verify Email Address',
+                text_email_message,
+                'noreply@{0}'.format(settings.DOMAIN),
+                [email_address],
+                html_message=html_email_message
+            )
+
+    async def _asend_email(self, token, email_address):
+        """
+        Sends a verification link to a user via email.
+        """
+        text_email_message, html_email_message = await sync_to_async(
+            self._get_email_content,
+            thread_sensitive=False
+        )(token)
+        with timed('mail-enqueue'):
+            await aqueue_mail(
+                'Verify Email Address',
+                text_email_message,
+                'noreply@{0}'.format(settings.DOMAIN),
+                [email_address],
+                html_message=html_email_message
+            )
 
     def save(self, *args, **kwargs):
         token = self._generate_token()
-        self.token = make_password(token)
+        self.selector = token[:TOKEN_SELECTOR_LENGTH]
+        self.token = make_password(token[TOKEN_SELECTOR_LENGTH:])
         self._send_email(token, self.email)
         models.Model.save(self, *args, **kwargs)
 
+    async def asave(self, *args, **kwargs):
+        token = self._generate_token()
+        self.selector = token[:TOKEN_SELECTOR_LENGTH]
+        self.token = await amake_password(token[TOKEN_SELECTOR_LENGTH:])
+        await self._asend_email(token, self.email)
+        # Model.asave() would call the save() method defined above.
+        await sync_to_async(models.Model.save)(self, *args, **kwargs)
+
     def is_current(self):
         """
         Returns True if email token was created less than 1 hour ago.
         """
         time_difference = timezone.now() - self.datetime
-        one_hour = datetime.timedelta(hours=1)
-        return one_hour > time_difference
+        return TOKEN_LIFETIME > time_difference
 
 
 class CustomResetPasswordTokenManager(models.Manager):
 
-    def check_token(self, token):
+    def current(self):
         """
-        Checks to see whether the given token exists.
+        Returns the tokens that haven't expired yet.
+        """
+        return self.filter(datetime__gt=timezone.now() - TOKEN_LIFETIME)
+
+    def get_token(self, token):
+        """
+        Returns the unexpired token object matching the given token.
+
+        The selector is used to find the token object, and the verifier
+        is then checked against the hash stored in the database.
+        """
+        selector = token[:TOKEN_SELECTOR_LENGTH]
+        verifier = token[TOKEN_SELECTOR_LENGTH:]
+        try:
+            reset_password_token_object = self.current().select_related(
+                'user'
+            ).get(selector=selector)
+        except ResetPasswordToken.DoesNotExist:
+            return self._get_legacy_token(token)
+        if not check_password(verifier, reset_password_token_object.token):
+            raise ResetPasswordToken.DoesNotExist
+        return reset_password_token_object
+
+    async def aget_token(self, token):
+        """
+        Returns the unexpired token object matching the given token.
+        """
+        selector = token[:TOKEN_SELECTOR_LENGTH]
+        verifier = token[TOKEN_SELECTOR_LENGTH:]
+        try:
+            reset_password_token_object = await self.current().select_related(
+                'user'
+            ).aget(selector=selector)
+        except ResetPasswordToken.DoesNotExist:
+            return await self._aget_legacy_token(token)
+        if not await acheck_password(
+            verifier,
+            reset_password_token_object.token
+        ):
+            raise ResetPasswordToken.DoesNotExist
+        return reset_password_token_object
+
+    def _get_legacy_token(self, token):
         """
-        reset_password_token_objects = self.all()
-        token_exists = False
+        Checks the given token against tokens created without a selector.
+        """
+        reset_password_token_objects = self.current().select_related(
+            'user'
+        ).filter(selector__isnull=True)
         for reset_password_token_object in reset_password_token_objects:
-            token_exists = check_password(
-                token,
-                reset_password_token_object.token
-            )
-            if token_exists:
-                user = reset_password_token_object.user
-                return user
+            if check_password(token, reset_password_token_object.token):
+                return reset_password_token_object
         raise ResetPasswordToken.DoesNotExist
 
+    async def _aget_legacy_token(self, token):
+        """
+        Checks the given token against tokens created without a selector.
+        """
+        reset_password_token_objects = self.current().select_related(
+            'user'
+        ).filter(selector__isnull=True)
+        async for reset_password_token_object in reset_password_token_objects:
+            if await acheck_password(token, reset_password_token_object.token):
+                return reset_password_token_object
+        raise ResetPasswordToken.DoesNotExist
+
+    def check_token(self, token):
+        """
+        Checks to see whether the given token exists.
+        """
+        return self.get_token(token).user
+
+    async def acheck_token(self, token):
+        """
+        Checks to see whether the given token exists.
+        """
+        return (await self.aget_token(token)).user
+
 
 class ResetPasswordToken(models.Model):
 
+    selector = models.CharField(
+        max_length=TOKEN_SELECTOR_LENGTH,
+        unique=True,
+        null=True
+    )
     token = models.CharField(max_length=256)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     datetime = models.DateTimeField(auto_now_add=True)
 
     objects = CustomResetPasswordTokenManager()
 
+    class Meta:
+        ordering = ['datetime']
+        get_latest_by = 'datetime'
+        indexes = [
+            models.Index(fields=['user', 'datetime']),
+            models.Index(fields=['datetime']),
+        ]
+
     async def _generate_token(self):
         """
         Creates a unique 32-character string.
@@ -251,9 +658,9 @@ class ResetPasswordToken(models.Model):
             )
         return token
 
-    async def _send_email(self, token, email_address):
+    def _get_email_content(self, token):
         """
-        Sends a verification link to a user via email.
+        Returns the text and HTML content of the reset password email.
         """
         # First, determine the URL for the verification link.
         verification_url = reverse(
@@ -275,23 +682,35 @@ class ResetPasswordToken(models.Model):
             'domain': settings.DOMAIN,
             'path': verification_url,
         }
-        html_email_message = render_to_string(
-            'password_reset_email.html',
-            template_context
-        )
-        # Finally, send the email.
-        send_mail(
-            'Reset Password',
-            text_email_message,
-            'noreply@{0}'.format(settings.DOMAIN),
-            [email_address],
-            fail_silently=False,
-            html_message=html_email_message
-        )
+        html_email_message = get_email_template(
+            'password_reset_email.html'
+        ).render(template_context)
+        return text_email_message, html_email_message
+
+    async def _send_email(self, token, email_address):
+        """
+        Sends a verification link to a user via email.
+
+        The email is rendered in a worker thread so that it doesn't
+        block the event loop.
+        """
+        text_email_message, html_email_message = await sync_to_async(
+            self._get_email_content,
+            thread_sensitive=False
+        )(token)
+        with timed('mail-enqueue'):
+            await aqueue_mail(
+                'Reset Password',
+                text_email_message,
+                'noreply@{0}'.format(settings.DOMAIN),
+                [email_address],
+                html_message=html_email_message
+            )
 
     async def asave(self, *args, **kwargs):
         token = await self._generate_token()
-        self.token = make_password(token)
+        self.selector = token[:TOKEN_SELECTOR_LENGTH]
+        self.token = await amake_password(token[TOKEN_SELECTOR_LENGTH:])
         await self._send_email(token, self.user.email)
         await models.Model.asave(self, *args, **kwargs)
 
@@ -300,5 +719,4 @@ class ResetPasswordToken(models.Model):
         Returns True if email token was created less than 1 hour ago.
         """
         time_difference = timezone.now() - self.datetime
-        one_hour = datetime.timedelta(hours=1)
-        return one_hour > time_difference
+        return TOKEN_LIFETIME > time_difference
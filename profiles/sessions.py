@@ -0,0 +1,48 @@
+"""
+Defines a session engine that reads sessions from the cache and only
+writes them when their data changes.
+"""
+
+from django.contrib.sessions.backends import cached_db
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    Stores sessions in the cache, backed by the database.
+
+    A session that is marked as modified but whose data is the same as
+    when it was loaded isn't written again.
+    """
+
+    _saved_data = None
+
+    def _serialize(self, session_data):
+        return self.serializer().dumps(session_data)
+
+    def _is_unchanged(self, must_create):
+        return (not must_create
+                and self.session_key is not None
+                and self._saved_data is not None
+                and self._saved_data == self._serialize(self._session))
+
+    def load(self):
+        session_data = super().load()
+        self._saved_data = self._serialize(session_data)
+        return session_data
+
+    async def aload(self):
+        session_data = await super().aload()
+        self._saved_data = self._serialize(session_data)
+        return session_data
+
+    def save(self, must_create=False):
+        if self._is_unchanged(must_create):
+            return
+        super().save(must_create)
+        self._saved_data = self._serialize(self._session)
+
+    async def asave(self, must_create=False):
+        if self._is_unchanged(must_create):
+            return
+        await super().asave(must_create)
+        self._saved_data = self._serialize(self._session)
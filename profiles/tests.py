@@ -0,0 +1,985 @@
+"""
+Tests for the profiles app.
+"""
+
+import asyncio
+import datetime
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import backends as auth_backends, hashers
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core import mail
+from django.core.cache import caches
+from django.core.checks import run_checks
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.autoreload import file_changed
+
+from drivers import sms
+from drivers.mail import get_queue
+from profiles import api_urls, urls
+from profiles.backends import ModelBackend
+from profiles.background import wait_for_background_tasks
+from profiles.checks import check_shared_caches
+from profiles.hashers import check_token_hash, make_token_hash
+from profiles.management.commands import send_email_verifications
+from profiles import models
+from profiles.models import EmailToken, PhoneToken, ResetPasswordToken, User
+from profiles.throttling import RateLimiter
+from profiles.utils import BreachedPasswordValidator
+
+
+PASSWORD = 'Test-Password-12345'
+
+# The timings of every request are logged when DEBUG is on, which would
+# bury the test results.
+request_logger = logging.getLogger('profiles.requests')
+
+
+def setUpModule():
+    request_logger.setLevel(logging.WARNING)
+
+
+def tearDownModule():
+    request_logger.setLevel(logging.NOTSET)
+
+
+class SlowPasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with enough iterations to stall the event loop noticeably if
+    a password were hashed on it, but few enough to keep tests quick.
+    """
+
+    iterations = 400_000
+
+
+# Number of queries made by each request. Lower these numbers when a
+# view gets cheaper; never raise them without a good reason.
+QUERY_BUDGETS = {
+    ('login', 'GET'): 0,
+    ('login', 'POST'): 9,
+    ('forgotten_password', 'GET'): 0,
+    ('forgotten_password_handler', 'POST'): 0,
+    ('forgotten_password_confirmation', 'GET'): 0,
+    ('reset_password', 'GET'): 5,
+    ('reset_password', 'POST'): 6,
+    ('reset_password_confirmation', 'GET'): 0,
+    ('create_user', 'POST'): 9,
+    ('add_mobile_number', 'GET'): 2,
+    ('add_mobile_number', 'POST'): 6,
+    ('create_user_success', 'GET'): 2,
+    ('email_verification', 'GET'): 2,
+    ('dashboard', 'GET'): 2,
+    ('logout', 'GET'): 4,
+    ('verify_mobile_number', 'POST'): 3,
+    ('timings', 'GET'): 2,
+}
+
+
+def create_user(email):
+    user = User(email=email)
+    user.set_password(PASSWORD)
+    user.save()
+    return user
+
+
+def get_emailed_token(url_name):
+    """
+    Returns the token in the link in the most recent email.
+    """
+    get_queue().flush()
+    path = reverse(url_name, args=['X' * 32]).replace('X' * 32, '')
+    match = re.search(
+        re.escape(path) + r'([A-Za-z0-9]{32})',
+        mail.outbox[-1].body
+    )
+    return match.group(1)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    SMS_BACKEND='drivers.backends.locmem.SmsBackend',
+    FORGOTTEN_PASSWORD_RESPONSE_TIME=0,
+    FORGOTTEN_PASSWORD_RESPONSE_JITTER=0,
+)
+class ProfilesTestCase(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def logged_in_client(self, email):
+        """
+        Returns a client logged in as a new user, after one request has
+        loaded anything that is cached between requests.
+        """
+        client = Client()
+        client.force_login(create_user(email))
+        client.get(reverse('dashboard'))
+        return client
+
+    def assertQueryBudget(self, url_name, method, request):
+        """
+        Checks that the request makes the number of queries in
+        QUERY_BUDGETS, and returns its response.
+        """
+        with self.assertNumQueries(QUERY_BUDGETS[(url_name, method)]):
+            return request()
+
+
+class QueryBudgetTests(ProfilesTestCase):
+
+    def test_every_url_has_a_budget(self):
+        url_names = {
+            pattern.name
+            for pattern in urls.urlpatterns + api_urls.urlpatterns
+            if isinstance(pattern, URLPattern)
+        }
+        self.assertEqual(
+            url_names,
+            {url_name for url_name, method in QUERY_BUDGETS}
+        )
+
+    def test_login(self):
+        client = Client()
+        url = reverse('login')
+        client.get(url)
+        self.assertQueryBudget('login', 'GET', lambda: client.get(url))
+        create_user('login@example.com')
+        response = self.assertQueryBudget('login', 'POST', lambda: (
+            Client().post(url, {
+                'username': 'login@example.com',
+                'password': PASSWORD,
+            })
+        ))
+        self.assertRedirects(response, reverse('dashboard'))
+
+    def test_forgotten_password(self):
+        client = Client()
+        for url_name in ('forgotten_password',
+                         'forgotten_password_confirmation',
+                         'reset_password_confirmation'):
+            url = reverse(url_name)
+            client.get(url)
+            self.assertQueryBudget(url_name, 'GET', lambda: client.get(url))
+
+    def test_reset_password(self):
+        # The reset link is sent in the background, so the handler makes
+        # no queries of its own.
+        self.assertQueryBudget(
+            'forgotten_password_handler',
+            'POST',
+            lambda: Client().post(
+                reverse('forgotten_password_handler'),
+                {'email': 'unknown@example.com'}
+            )
+        )
+        wait_for_background_tasks()
+        user = create_user('reset@example.com')
+        async_to_sync(user.send_reset_password_email)()
+        client = Client()
+        url = reverse(
+            'reset_password',
+            args=[get_emailed_token('reset_password')]
+        )
+        self.assertQueryBudget(
+            'reset_password',
+            'GET',
+            lambda: client.get(url)
+        )
+        response = self.assertQueryBudget(
+            'reset_password',
+            'POST',
+            lambda: client.post(url, {
+                'password': PASSWORD + '!',
+                'confirm_password': PASSWORD + '!',
+            })
+        )
+        self.assertRedirects(response, reverse('reset_password_confirmation'))
+
+    def test_create_user(self):
+        response = self.assertQueryBudget(
+            'create_user',
+            'POST',
+            lambda: Client().post(reverse('create_user'), {
+                'email': 'new@example.com',
+                'confirm_email': 'new@example.com',
+                'password': PASSWORD,
+                'confirm_password': PASSWORD,
+                'secret_key': settings.SECRET_SAUCE,
+            })
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_add_mobile_number(self):
+        client = self.logged_in_client('mobile@example.com')
+        url = reverse('add_mobile_number')
+        self.assertQueryBudget(
+            'add_mobile_number',
+            'GET',
+            lambda: client.get(url)
+        )
+        self.assertQueryBudget(
+            'verify_mobile_number',
+            'POST',
+            lambda: client.post(
+                reverse('verify_mobile_number'),
+                json.dumps({'mobile_number': '6135550100'}),
+                content_type='application/json'
+            )
+        )
+        sms_token = re.search(
+            r'\d{6}',
+            sms.messages.get_latest('+16135550100').message
+        ).group(0)
+        response = self.assertQueryBudget(
+            'add_mobile_number',
+            'POST',
+            lambda: client.post(url, {
+                'mobile_number': '6135550100',
+                'sms_token': sms_token,
+            })
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_email_verification(self):
+        create_user('verify@example.com').create_email_token()
+        url = reverse(
+            'email_verification',
+            args=[get_emailed_token('email_verification')]
+        )
+        self.assertQueryBudget(
+            'email_verification',
+            'GET',
+            lambda: Client().get(url)
+        )
+
+    def test_logged_in_pages(self):
+        client = self.logged_in_client('pages@example.com')
+        for url_name in ('create_user_success', 'dashboard', 'logout'):
+            url = reverse(url_name)
+            self.assertQueryBudget(url_name, 'GET', lambda: client.get(url))
+
+    def test_timings(self):
+        client = self.logged_in_client('admin@example.com')
+        with self.settings(ADMINS=[('Admin', 'admin@example.com')]):
+            response = self.assertQueryBudget(
+                'timings',
+                'GET',
+                lambda: client.get(reverse('timings'))
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SESSION_ENGINE='profiles.sessions', USER_CACHE='default')
+class CachedSessionTests(ProfilesTestCase):
+
+    def test_cached_request_makes_no_queries(self):
+        client = self.logged_in_client('cached@example.com')
+        for url_name in ('dashboard', 'add_mobile_number'):
+            with self.assertNumQueries(0):
+                response = client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+
+    def test_password_change_ends_sessions(self):
+        client = self.logged_in_client('change@example.com')
+        user = User.objects.get(email='change@example.com')
+        user.set_password(PASSWORD + '!')
+        user.save()
+        response = client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_change_while_caching_user(self):
+        user = create_user('race@example.com')
+        stale_user = User.objects.get(pk=user.pk)
+
+        def load_user(backend, user_id):
+            # The password changes after the request has read the user
+            # but before it has cached it.
+            user.set_password(PASSWORD + '!')
+            user.save()
+            return stale_user
+
+        backend = ModelBackend()
+        with mock.patch.object(
+                auth_backends.ModelBackend,
+                'get_user',
+                autospec=True,
+                side_effect=load_user):
+            self.assertEqual(backend.get_user(user.pk), stale_user)
+        self.assertEqual(backend.get_user(user.pk).password, user.password)
+
+    async def test_change_while_caching_user_async(self):
+        user = await sync_to_async(create_user)('arace@example.com')
+        stale_user = await User.objects.aget(pk=user.pk)
+
+        async def load_user(backend, user_id):
+            await user.aset_password(PASSWORD + '!')
+            await user.asave()
+            return stale_user
+
+        backend = ModelBackend()
+        with mock.patch.object(
+                auth_backends.ModelBackend,
+                'aget_user',
+                autospec=True,
+                side_effect=load_user):
+            self.assertEqual(await backend.aget_user(user.pk), stale_user)
+        self.assertEqual(
+            (await backend.aget_user(user.pk)).password,
+            user.password
+        )
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class AnonymousPageTests(ProfilesTestCase):
+
+    def get_page(self, client, if_none_match=None):
+        headers = {}
+        if if_none_match is not None:
+            headers['If-None-Match'] = if_none_match
+        return client.get(reverse('forgotten_password'), headers=headers)
+
+    def test_cached_page_has_visitors_csrf_token(self):
+        # The first visitor fills the cache; the second is served the
+        # cached page with their own token substituted.
+        self.get_page(Client())
+        client = Client(enforce_csrf_checks=True)
+        response = self.get_page(client)
+        csrf_token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"',
+            response.content.decode()
+        ).group(1)
+        response = client.post(reverse('forgotten_password_handler'), {
+            'email': 'cached@example.com',
+            'csrfmiddlewaretoken': csrf_token,
+        })
+        wait_for_background_tasks()
+        self.assertEqual(response.status_code, 302)
+
+    def test_conditional_get(self):
+        client = Client()
+        etag = self.get_page(client).headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        for if_none_match in (etag,
+                              etag[2:],
+                              '"other", {0}'.format(etag),
+                              '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get_page(client, if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers['ETag'], etag)
+        response = self.get_page(client, '"other"')
+        self.assertEqual(response.status_code, 200)
+
+
+class SharedCacheCheckTests(TestCase):
+
+    def test_default_settings(self):
+        self.assertEqual(check_shared_caches(None), [])
+        self.assertEqual(run_checks(tags=['caches']), [])
+
+    @override_settings(SESSION_ENGINE='profiles.sessions')
+    def test_cached_sessions_in_local_cache(self):
+        self.assertEqual(
+            [error.id for error in check_shared_caches(None)],
+            ['profiles.E001']
+        )
+
+    @override_settings(USER_CACHE='default')
+    def test_users_in_local_cache(self):
+        self.assertEqual(
+            [error.id for error in check_shared_caches(None)],
+            ['profiles.E002']
+        )
+
+
+class TokenIndexTests(TestCase):
+
+    def test_latest_token_uses_user_datetime_index(self):
+        if connection.vendor != 'sqlite':
+            # Server databases may prefer a table scan on an empty table.
+            self.skipTest('Query plans are only checked on SQLite.')
+        user = create_user('index@example.com')
+        for model in (PhoneToken, EmailToken, ResetPasswordToken):
+            index_name = next(
+                index.name
+                for index in model._meta.indexes
+                if index.fields == ['user', 'datetime']
+            )
+            # The query made by user.phonetoken_set.last() and friends.
+            tokens = model.objects.filter(user=user).reverse()[:1]
+            with self.subTest(model=model.__name__):
+                plan = tokens.explain()
+                self.assertIn(index_name, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['profiles.tests.SlowPasswordHasher'],
+    SMS_BACKEND='drivers.backends.locmem.SmsBackend',
+)
+class EventLoopLagTests(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        start = time.perf_counter()
+        SlowPasswordHasher().encode(PASSWORD, 'salt')
+        self.hash_time = time.perf_counter() - start
+
+    async def _probe(self, stop, lags):
+        """
+        Records how much later than requested each short sleep ends.
+        """
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def get_max_lag(self, *coroutines):
+        """
+        Runs the coroutines concurrently, and returns their results and
+        the longest time the event loop was blocked while they ran.
+        """
+        stop = asyncio.Event()
+        lags = []
+        probe = asyncio.create_task(self._probe(stop, lags))
+        results = await asyncio.gather(*coroutines)
+        stop.set()
+        await probe
+        return results, max(lags)
+
+    async def create_users(self, count):
+        users = []
+        for number in range(count):
+            user = User(email='lag{0}@example.com'.format(number))
+            await user.aset_password(PASSWORD)
+            await user.asave()
+            users.append(user)
+        return users
+
+    async def test_concurrent_logins_dont_block_event_loop(self):
+        users = await self.create_users(4)
+        responses, max_lag = await self.get_max_lag(*[
+            AsyncClient().post(reverse('login'), {
+                'username': user.email,
+                'password': PASSWORD,
+            })
+            for user in users
+        ])
+        for response in responses:
+            self.assertRedirects(
+                response,
+                reverse('dashboard'),
+                fetch_redirect_response=False
+            )
+        # Hashing a password on the loop would stall it for a whole hash.
+        self.assertLess(max_lag, self.hash_time / 2)
+
+    async def test_reset_password_emails_dont_block_event_loop(self):
+        users = await self.create_users(3)
+        results, max_lag = await self.get_max_lag(*[
+            user.send_reset_password_email() for user in users
+        ])
+        await sync_to_async(get_queue().flush, thread_sensitive=False)()
+        self.assertEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            [user.email for user in users]
+        )
+        self.assertEqual(await ResetPasswordToken.objects.acount(), 3)
+        self.assertLess(max_lag, self.hash_time / 2)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['profiles.tests.SlowPasswordHasher'],
+    FORGOTTEN_PASSWORD_RESPONSE_TIME=0.2,
+    FORGOTTEN_PASSWORD_RESPONSE_JITTER=0,
+)
+class ForgottenPasswordTests(TransactionTestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def request_reset_link(self, email):
+        """
+        Returns how long a forgotten password request took.
+        """
+        start = time.monotonic()
+        response = Client().post(
+            reverse('forgotten_password_handler'),
+            {'email': email}
+        )
+        duration = time.monotonic() - start
+        self.assertRedirects(
+            response,
+            reverse('forgotten_password_confirmation')
+        )
+        return duration
+
+    def test_response_time_doesnt_depend_on_account(self):
+        create_user('exists@example.com')
+        start = time.monotonic()
+        SlowPasswordHasher().encode(PASSWORD, 'salt')
+        hash_time = time.monotonic() - start
+        durations = []
+        for email in ('exists@example.com', 'missing@example.com'):
+            durations.append(self.request_reset_link(email))
+            # Don't let one request's background work slow the next.
+            wait_for_background_tasks()
+        for duration in durations:
+            self.assertGreaterEqual(duration, 0.2)
+        # Only an existing account costs a hash, so the two must be much
+        # closer than that.
+        self.assertLess(abs(durations[0] - durations[1]), hash_time / 2)
+        get_queue().flush()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['exists@example.com'])
+
+    def test_response_time_setting(self):
+        with self.settings(FORGOTTEN_PASSWORD_RESPONSE_TIME=0.05):
+            self.assertLess(self.request_reset_link('x@example.com'), 0.2)
+        wait_for_background_tasks()
+
+
+class PurgeTokensTests(ProfilesTestCase):
+
+    def expire(self, model, count):
+        """
+        Moves the first count tokens of the model past their lifetime.
+        """
+        model.objects.filter(
+            pk__in=model.objects.values_list('pk', flat=True)[:count]
+        ).update(
+            datetime=timezone.now() - models.TOKEN_LIFETIME
+            - datetime.timedelta(minutes=1)
+        )
+
+    def test_only_expired_tokens_are_deleted(self):
+        user = create_user('purge@example.com')
+        # bulk_create() doesn't call save(), so nothing is sent.
+        PhoneToken.objects.bulk_create(
+            PhoneToken(token='token', phone='+16135550100', user=user)
+            for number in range(7)
+        )
+        EmailToken.objects.bulk_create(
+            EmailToken(
+                token='token',
+                email='token{0}@example.com'.format(number),
+                user=user
+            )
+            for number in range(4)
+        )
+        ResetPasswordToken.objects.bulk_create(
+            ResetPasswordToken(token='token', user=user)
+            for number in range(4)
+        )
+        self.expire(PhoneToken, 5)
+        self.expire(EmailToken, 2)
+        self.expire(ResetPasswordToken, 3)
+        stdout = io.StringIO()
+        call_command('purge_tokens', '--chunk-size=2', stdout=stdout)
+        self.assertEqual(
+            re.findall(r'Deleted (\d+) (\w+) objects', stdout.getvalue()),
+            [
+                ('5', 'PhoneToken'),
+                ('2', 'EmailToken'),
+                ('3', 'ResetPasswordToken'),
+            ]
+        )
+        cutoff = timezone.now() - models.TOKEN_LIFETIME
+        for model, remaining in ((PhoneToken, 2),
+                                 (EmailToken, 2),
+                                 (ResetPasswordToken, 1)):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.count(), remaining)
+                self.assertFalse(
+                    model.objects.filter(datetime__lte=cutoff).exists()
+                )
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ImportUsersTests(TestCase):
+
+    def import_users(self, lines):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        call_command('import_users', self.path, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'users.jsonl')
+
+    def test_invalid_lines_are_skipped(self):
+        create_user('taken@example.com')
+        stdout, stderr = self.import_users([
+            json.dumps({'email': 'new@example.com', 'password': PASSWORD}),
+            '{"email": ',
+            '[1]',
+            json.dumps({
+                'email': 'long@example.com',
+                'password': PASSWORD,
+                'mobile_number': '1' * 13,
+            }),
+            json.dumps({'email': 'taken@example.com', 'password': PASSWORD}),
+        ])
+        self.assertIn('Created 1 users and skipped 4.', stdout)
+        self.assertEqual(
+            stderr.splitlines(),
+            [
+                'Skipped line 2: Each line must be a JSON object.',
+                'Skipped line 3: Each line must be a JSON object.',
+                'Skipped line 4: mobile_number is longer than 12 '
+                'characters.',
+                'Skipped line 5: User already exists.',
+            ]
+        )
+        self.assertTrue(
+            User.objects.get(email='new@example.com').check_password(PASSWORD)
+        )
+
+    def test_user_created_during_import(self):
+        def make_passwords(passwords):
+            # Someone signs up while the batch's passwords are hashed.
+            create_user('race@example.com')
+            return [make_password(password) for password in passwords]
+
+        with mock.patch('profiles.bulk.make_passwords', make_passwords):
+            stdout, stderr = self.import_users([
+                json.dumps({'email': 'race@example.com', 'password': 'x'}),
+                json.dumps({'email': 'other@example.com', 'password': 'x'}),
+            ])
+        self.assertIn('Created 1 users and skipped 1.', stdout)
+        self.assertEqual(stderr, 'Skipped line 1: User already exists.\n')
+        self.assertTrue(
+            User.objects.get(email='race@example.com').check_password(PASSWORD)
+        )
+
+    def test_export_to_stdout(self):
+        create_user('export@example.com')
+        stdout = io.StringIO()
+        call_command('export_users', '-', stdout=stdout)
+        self.assertEqual(
+            json.loads(stdout.getvalue())['email'],
+            'export@example.com'
+        )
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    EMAIL_QUEUE_BACKEND='drivers.queues.database.MailQueue',
+)
+class SendEmailVerificationsTests(TestCase):
+
+    def test_sends_links(self):
+        create_user('first@example.com')
+        create_user('second@example.com')
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_path = os.path.join(directory, 'checkpoint')
+            call_command(
+                'send_email_verifications',
+                'second@example.com',
+                checkpoint=checkpoint_path,
+                stdout=io.StringIO()
+            )
+            self.assertFalse(os.path.exists(checkpoint_path))
+        self.assertEqual(
+            [email.to for email in mail.outbox],
+            [['second@example.com']]
+        )
+
+    def test_checkpoint_depends_on_emails(self):
+        command = send_email_verifications.Command()
+        paths = {
+            command.get_checkpoint_path([]),
+            command.get_checkpoint_path(['a@example.com']),
+            command.get_checkpoint_path(['b@example.com']),
+        }
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(
+            command.get_checkpoint_path(['a@example.com', 'b@example.com']),
+            command.get_checkpoint_path(['b@example.com', 'a@example.com'])
+        )
+
+    @override_settings(EMAIL_QUEUE_BACKEND='drivers.queues.locmem.MailQueue')
+    def test_requires_database_queue(self):
+        with self.assertRaises(CommandError):
+            call_command('send_email_verifications')
+
+
+@override_settings(THROTTLE_RATES={'test': (5, 60), 'login': (2, 60)})
+class ThrottlingTests(ProfilesTestCase):
+
+    def login(self, password):
+        return Client().post(reverse('login'), {
+            'username': 'throttle@example.com',
+            'password': password,
+        })
+
+    def test_only_failed_logins_count(self):
+        create_user('throttle@example.com')
+        for attempt in range(5):
+            self.assertEqual(self.login(PASSWORD).status_code, 302)
+        for attempt in range(2):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        self.assertEqual(self.login(PASSWORD).status_code, 429)
+
+    def test_identifier_kinds_are_counted_separately(self):
+        limiter = RateLimiter('test')
+        for attempt in range(5):
+            self.assertTrue(limiter.allow(ip='192.0.2.1'))
+        self.assertFalse(limiter.allow(ip='192.0.2.1'))
+        self.assertTrue(limiter.allow(user='192.0.2.1'))
+
+    def test_concurrent_attempts(self):
+        limiter = RateLimiter('test')
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(
+                lambda attempt: limiter.allow(ip='192.0.2.1'),
+                range(20)
+            ))
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(
+            limiter.get_counters(),
+            {'allowed': 5, 'rejected': 15}
+        )
+
+
+class BreachedPasswordTests(TestCase):
+
+    def build(self, lines, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        input_path = os.path.join(directory.name, 'passwords.txt')
+        output_path = os.path.join(directory.name, 'passwords.bin')
+        with open(input_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        call_command(
+            'build_breached_passwords',
+            input_path,
+            output_path,
+            *args,
+            stdout=stdout,
+            stderr=stderr
+        )
+        return BreachedPasswordValidator(output_path), stderr.getvalue()
+
+    def test_passwords(self):
+        validator, stderr = self.build(['password', 'hunter2', 'password'])
+        self.assertTrue(validator.is_breached('hunter2'))
+        self.assertFalse(validator.is_breached(PASSWORD))
+        self.assertEqual(stderr, '')
+
+    def test_invalid_digests_are_skipped(self):
+        validator, stderr = self.build([
+            '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8:3861493',
+            'not a digest',
+            'F3BBBD66A63D4BF1747940578EC3D0103530E21D0',
+            'ABCDEF',
+            'F3BBBD66A63D4BF1747940578EC3D0103530E21D',
+        ], '--hashed')
+        self.assertEqual(validator._count, 2)
+        self.assertTrue(validator.is_breached('password'))
+        self.assertTrue(validator.is_breached('hunter2'))
+        self.assertEqual(
+            stderr.splitlines(),
+            [
+                'Skipped line {0}: not a SHA-1 digest.'.format(line_number)
+                for line_number in (2, 3, 4)
+            ]
+        )
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTests(ProfilesTestCase):
+
+    def get_stages(self, response):
+        return {
+            metric.split(';')[0].strip()
+            for metric in response.headers['Server-Timing'].split(',')
+        }
+
+    def test_hashing_and_waiting_are_timed_separately(self):
+        create_user('timing@example.com')
+        response = Client().post(reverse('login'), {
+            'username': 'timing@example.com',
+            'password': PASSWORD,
+        })
+        self.assertLessEqual({'hash', 'hash-wait'}, self.get_stages(response))
+
+    def test_mail_enqueue_is_timed(self):
+        response = Client().post(reverse('create_user'), {
+            'email': 'timing@example.com',
+            'confirm_email': 'timing@example.com',
+            'password': PASSWORD,
+            'confirm_password': PASSWORD,
+            'secret_key': settings.SECRET_SAUCE,
+        })
+        client = Client()
+        client.cookies = response.cookies
+        client.post(
+            reverse('verify_mobile_number'),
+            json.dumps({'mobile_number': '6135550100'}),
+            content_type='application/json'
+        )
+        sms_token = re.search(
+            r'\d{6}',
+            sms.messages.get_latest('+16135550100').message
+        ).group(0)
+        response = client.post(reverse('add_mobile_number'), {
+            'mobile_number': '6135550100',
+            'sms_token': sms_token,
+        })
+        self.assertIn('mail-enqueue', self.get_stages(response))
+
+
+class SmsTokenTests(ProfilesTestCase):
+
+    def send_token(self, email):
+        """
+        Creates a user, sends them an SMS code and returns the user and
+        the code.
+        """
+        user = create_user(email)
+        user.add_new_mobile_number('+16135550100')
+        sms_token = re.search(
+            r'\d{6}',
+            sms.messages.get_latest('+16135550100').message
+        ).group(0)
+        return user, sms_token
+
+    def test_correct_token(self):
+        user, sms_token = self.send_token('sms@example.com')
+        self.assertTrue(user.check_sms_token(sms_token))
+        user.refresh_from_db()
+        self.assertEqual(user.mobile_number, '+16135550100')
+
+    def test_attempts_are_limited(self):
+        user, sms_token = self.send_token('guesses@example.com')
+        wrong_token = '{0:06d}'.format((int(sms_token) + 1) % 10 ** 6)
+        for attempt in range(models.MAX_SMS_TOKEN_ATTEMPTS):
+            self.assertFalse(user.check_sms_token(wrong_token))
+        self.assertFalse(user.check_sms_token(sms_token))
+        user.refresh_from_db()
+        self.assertEqual(user.mobile_number, '')
+
+    def test_legacy_token(self):
+        user, sms_token = self.send_token('legacy-sms@example.com')
+        # Codes were hashed with the password hasher before
+        # make_token_hash() existed.
+        PhoneToken.objects.filter(user=user).update(
+            token=make_password(sms_token)
+        )
+        self.assertTrue(user.check_sms_token(sms_token))
+
+    def test_token_hash(self):
+        encoded = make_token_hash('123456')
+        self.assertTrue(encoded.startswith('hmac_sha256$'))
+        self.assertTrue(check_token_hash('123456', encoded))
+        self.assertFalse(check_token_hash('123457', encoded))
+        self.assertNotEqual(make_token_hash('123456'), encoded)
+
+
+class EmailTokenTests(ProfilesTestCase):
+
+    def create_token(self, email):
+        """
+        Creates an email token and returns the token sent by email.
+        """
+        create_user(email).create_email_token()
+        return get_emailed_token('email_verification')
+
+    def make_legacy(self, token, age=datetime.timedelta()):
+        """
+        Turns the token's row into one made before selectors existed,
+        which hashes the whole token.
+        """
+        EmailToken.objects.filter(
+            selector=token[:models.TOKEN_SELECTOR_LENGTH]
+        ).update(
+            selector=None,
+            token=make_password(token),
+            datetime=timezone.now() - age
+        )
+
+    def verify(self, token):
+        return Client().get(reverse('email_verification', args=[token]))
+
+    def test_selector(self):
+        token = self.create_token('selector@example.com')
+        self.assertEqual(self.verify(token).status_code, 200)
+
+    def test_wrong_verifier(self):
+        token = self.create_token('verifier@example.com')
+        wrong_token = token[:models.TOKEN_SELECTOR_LENGTH] + 'X' * 20
+        self.assertEqual(self.verify(wrong_token).status_code, 404)
+
+    def test_legacy_token(self):
+        token = self.create_token('legacy@example.com')
+        self.make_legacy(token)
+        self.assertEqual(self.verify(token).status_code, 200)
+
+    def test_expired_legacy_tokens_arent_checked(self):
+        for number in range(5):
+            email = 'old{0}@example.com'.format(number)
+            self.make_legacy(
+                self.create_token(email),
+                age=datetime.timedelta(days=30)
+            )
+        with mock.patch.object(
+            hashers,
+            'verify_password',
+            wraps=hashers.verify_password
+        ) as verify_password:
+            self.assertEqual(self.verify('X' * 32).status_code, 404)
+        verify_password.assert_not_called()
+
+
+class EmailTemplateTests(TestCase):
+
+    def test_template_change_clears_cache(self):
+        template = models.get_email_template('email_verification.html')
+        self.assertIs(
+            models.get_email_template('email_verification.html'),
+            template
+        )
+        file_changed.send(
+            sender=None,
+            file_path=settings.BASE_DIR / 'profiles' / 'models.py'
+        )
+        self.assertIs(
+            models.get_email_template('email_verification.html'),
+            template
+        )
+        file_changed.send(
+            sender=None,
+            file_path=settings.BASE_DIR / 'templates' / 'base.html'
+        )
+        self.assertIsNot(
+            models.get_email_template('email_verification.html'),
+            template
+        )
@@ -0,0 +1,159 @@
+"""
+Defines rate limiters used to slow down brute-force attacks.
+"""
+
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_client_ip(request):
+    """
+    Returns the IP address that the request was sent from.
+    """
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class RateLimiter:
+    """
+    Limits how many times an action can be performed within a period.
+
+    Attempts are counted per identifier, such as an IP address or a user,
+    in fixed windows stored in the cache. The count for the sliding
+    window ending now is estimated from the current window plus the
+    overlapping fraction of the previous window.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    @property
+    def rate(self):
+        return settings.THROTTLE_RATES[self.scope]
+
+    def _make_key(self, kind, identifier, window):
+        digest = hashlib.sha256(str(identifier).encode()).hexdigest()
+        return 'throttle:{0}:{1}:{2}:{3}'.format(
+            self.scope,
+            kind,
+            digest,
+            window
+        )
+
+    def _make_counter_key(self, name):
+        return 'throttle:{0}:{1}'.format(self.scope, name)
+
+    def _get_keys(self, identifiers, now):
+        """
+        Returns the current and previous window keys for each identifier,
+        and the weight given to the previous window.
+        """
+        limit, period = self.rate
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        keys = [
+            (
+                self._make_key(kind, identifier, window),
+                self._make_key(kind, identifier, window - 1),
+            )
+            for kind, identifier in identifiers.items()
+        ]
+        return keys, 1 - elapsed / period
+
+    def _increment(self, key, timeout):
+        """
+        Adds one to the count stored under the key, and returns it.
+        """
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # The key expired between add() and incr().
+            self.cache.set(key, 1, timeout=timeout)
+            return 1
+
+    def _decrement(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            # The key has already expired.
+            pass
+
+    def allow(self, **identifiers):
+        """
+        Records an attempt and returns True if it is within the limit.
+
+        Identifiers are given by kind, such as ip='192.0.2.1' and
+        user='name@example.com'. The attempt is rejected if any of them
+        has reached the limit. Each count is incremented before it's
+        checked, so concurrent attempts can't all get in under the
+        limit. Rejected attempts aren't added to the counts.
+        """
+        limit, period = self.rate
+        keys, weight = self._get_keys(identifiers, time.time())
+        counts = [
+            self._increment(current_key, 2 * period)
+            for current_key, previous_key in keys
+        ]
+        previous = self.cache.get_many(
+            [previous_key for current_key, previous_key in keys]
+        )
+        if any(
+            count + previous.get(previous_key, 0) * weight > limit
+            for count, (current_key, previous_key) in zip(counts, keys)
+        ):
+            for current_key, previous_key in keys:
+                self._decrement(current_key)
+            self._increment(self._make_counter_key('rejected'), None)
+            return False
+        self._increment(self._make_counter_key('allowed'), None)
+        return True
+
+    def release(self, **identifiers):
+        """
+        Removes an attempt recorded by allow(), for example because the
+        attempt succeeded and only failures should count.
+        """
+        keys, _ = self._get_keys(identifiers, time.time())
+        for current_key, previous_key in keys:
+            self._decrement(current_key)
+
+    async def aallow(self, **identifiers):
+        """
+        Records an attempt and returns True if it is within the limit.
+        """
+        return await sync_to_async(self.allow, thread_sensitive=False)(
+            **identifiers
+        )
+
+    async def arelease(self, **identifiers):
+        """
+        Removes an attempt recorded by aallow().
+        """
+        await sync_to_async(self.release, thread_sensitive=False)(
+            **identifiers
+        )
+
+    def get_counters(self):
+        """
+        Returns the number of attempts allowed and rejected so far.
+        """
+        allowed_key = self._make_counter_key('allowed')
+        rejected_key = self._make_counter_key('rejected')
+        stored = self.cache.get_many([allowed_key, rejected_key])
+        return {
+            'allowed': stored.get(allowed_key, 0),
+            'rejected': stored.get(rejected_key, 0),
+        }
+
+
+login_rate_limiter = RateLimiter('login')
+forgotten_password_rate_limiter = RateLimiter('forgotten_password')
+verify_mobile_number_rate_limiter = RateLimiter('verify_mobile_number')
@@ -2,26 +2,42 @@
 Defines utility classes and functions for managing user accounts.
 """
 
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import mmap
+import os
+import secrets
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.template import engines
+from django.utils import timezone
+
+from profiles import models
 
 
 User = get_user_model()
 
+# Number of bytes in each digest in a breached password file.
+BREACHED_PASSWORD_DIGEST_SIZE = 20
+
 
 class SpecialCharacterPasswordValidator:
     """
     Custom password validator to ensure special characters are used.
     """
 
+    special_characters = frozenset('~`!@#$%^&*()-_=+[{]};:\'"<>/?')
+
     def validate(self, password, user=None):
-        special_characters = '~`!@#$%^&*()-_=+[{]};:\'"<>/?'
-        for character in password:
-            if character in special_characters:
-                break
-            else:
-                continue
-        else:
+        if self.special_characters.isdisjoint(password):
             raise ValidationError(
                 'Password must contain at least one special character',
                 code='missing_special_character'
@@ -31,15 +47,246 @@ class SpecialCharacterPasswordValidator:
         return 'Your password must contain at least one special character.'
 
 
+class BreachedPasswordValidator:
+    """
+    Rejects passwords that have appeared in data breaches.
+
+    The breached passwords are read from a file of sorted SHA-1 digests,
+    made with the build_breached_passwords command. The file is memory
+    mapped and binary searched, so lookups take microseconds and the
+    operating system shares its pages between every worker process.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._digests = mmap.mmap(
+                    f.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+            else:
+                # Empty files can't be memory mapped.
+                self._digests = b''
+        self._count = len(self._digests) // BREACHED_PASSWORD_DIGEST_SIZE
+
+    def _get_digest(self, index):
+        start = index * BREACHED_PASSWORD_DIGEST_SIZE
+        return self._digests[start:start + BREACHED_PASSWORD_DIGEST_SIZE]
+
+    def is_breached(self, password):
+        """
+        Returns True if the password is in the file.
+        """
+        digest = hashlib.sha1(password.encode()).digest()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_digest(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self._count and self._get_digest(low) == digest
+
+    def validate(self, password, user=None):
+        if self.is_breached(password):
+            raise ValidationError(
+                'This password has appeared in a data breach',
+                code='password_breached'
+            )
+
+    def get_help_text(self):
+        return 'Your password can\'t have appeared in a data breach.'
+
+
+def _read_breached_password_digests(path, hashed, skipped):
+    """
+    Yields the SHA-1 digest of each password in a text file.
+
+    If hashed is True, each line holds a hexadecimal SHA-1 digest,
+    optionally followed by a colon and a count, as in the files
+    published by Have I Been Pwned. Otherwise each line holds a
+    password. The numbers of lines that don't hold a valid digest are
+    added to the skipped list.
+    """
+    with open(path, encoding='utf-8', errors='surrogateescape') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            if hashed:
+                try:
+                    digest = bytes.fromhex(line.partition(':')[0])
+                except ValueError:
+                    digest = None
+                # A digest of any other size would misalign every digest
+                # after it in the file.
+                if (digest is None
+                        or len(digest) != BREACHED_PASSWORD_DIGEST_SIZE):
+                    skipped.append(line_number)
+                    continue
+                yield digest
+            else:
+                yield hashlib.sha1(
+                    line.encode('utf-8', errors='surrogateescape')
+                ).digest()
+
+
+def _read_digest_file(f):
+    while True:
+        digest = f.read(BREACHED_PASSWORD_DIGEST_SIZE)
+        if not digest:
+            return
+        yield digest
+
+
+def build_breached_password_file(input_path, output_path, hashed=False,
+                                 chunk_size=1000000):
+    """
+    Writes the file read by BreachedPasswordValidator.
+
+    The passwords are sorted in chunks of chunk_size, each written to a
+    temporary file, and the chunks are then merged, so the input can be
+    far larger than the memory available. Returns the number of unique
+    digests written, and the numbers of the lines that were skipped
+    because they didn't hold a valid digest.
+    """
+    skipped = []
+    digests = _read_breached_password_digests(input_path, hashed, skipped)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        chunk_paths = []
+        while True:
+            chunk = sorted(itertools.islice(digests, chunk_size))
+            if not chunk:
+                break
+            chunk_path = os.path.join(
+                temp_dir,
+                'chunk{0}'.format(len(chunk_paths))
+            )
+            with open(chunk_path, 'wb') as f:
+                f.write(b''.join(chunk))
+            chunk_paths.append(chunk_path)
+        with contextlib.ExitStack() as stack:
+            chunks = [
+                _read_digest_file(stack.enter_context(open(path, 'rb')))
+                for path in chunk_paths
+            ]
+            output = stack.enter_context(open(output_path, 'wb'))
+            count = 0
+            previous = None
+            for digest in heapq.merge(*chunks):
+                if digest != previous:
+                    output.write(digest)
+                    count += 1
+                    previous = digest
+    return count, skipped
+
+
 async def reset_password(email):
     """
     Sends a user an email with a link to reset their password.
+
+    Returns True if the user exists and an email was sent. This takes
+    longer when the user exists, so run it in the background rather
+    than while handling a request.
     """
     try:
         user = await User.objects.aget(email=email)
     except:
         # If the user doesn't exist, do nothing.
-        return
+        return False
     else:
         await user.send_reset_password_email()
-    return
+    return True
+
+
+class ResponseTimer:
+    """
+    Pads responses so that they all take the same amount of time.
+
+    Each response takes the duration in the named setting, plus a random
+    amount of jitter (also read from a setting). The work behind the
+    response must not be done while handling it, or slow work could
+    still take longer than the padding.
+    """
+
+    def __init__(self, duration_setting, jitter_setting):
+        self.duration_setting = duration_setting
+        self.jitter_setting = jitter_setting
+        self._random = secrets.SystemRandom()
+
+    @property
+    def duration(self):
+        return getattr(settings, self.duration_setting)
+
+    @property
+    def jitter(self):
+        return getattr(settings, self.jitter_setting)
+
+    def get_target(self):
+        """
+        Returns the number of seconds the next response should take.
+        """
+        return self.duration + self._random.uniform(0, self.jitter)
+
+    async def pad(self, started):
+        """
+        Waits until the target time has passed since the given start time.
+        """
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(max(0, self.get_target() - elapsed))
+
+
+def purge_expired_tokens(chunk_size=1000, pause=0):
+    """
+    Deletes expired phone, email and reset password tokens.
+
+    Rows are deleted in chunks of at most chunk_size, each in its own
+    transaction, so that other writers aren't locked out for long. The
+    optional pause (in seconds) is slept between chunks. Returns a dict
+    mapping each model name to the number of rows deleted and the
+    number of seconds taken.
+    """
+    cutoff = timezone.now() - models.TOKEN_LIFETIME
+    results = {}
+    for model in (models.PhoneToken,
+                  models.EmailToken,
+                  models.ResetPasswordToken):
+        started = time.monotonic()
+        deleted = 0
+        while True:
+            expired_ids = list(
+                model.objects.filter(datetime__lte=cutoff)
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not expired_ids:
+                break
+            count, _ = model.objects.filter(pk__in=expired_ids).delete()
+            deleted += count
+            if pause:
+                time.sleep(pause)
+        results[model.__name__] = (deleted, time.monotonic() - started)
+    return results
+
+
+def warm_template_cache():
+    """
+    Compiles every template in the project's template directories.
+
+    With the cached template loader, this moves the cost of compiling
+    templates from the first requests to startup. Returns the number of
+    templates compiled.
+    """
+    count = 0
+    for engine in engines.all():
+        for template_dir in engine.dirs:
+            template_dir = Path(template_dir)
+            for path in sorted(template_dir.rglob('*.html')):
+                engine.get_template(
+                    path.relative_to(template_dir).as_posix()
+                )
+                count += 1
+    for template_name in ('email_verification.html',
+                          'password_reset_email.html'):
+        models.get_email_template(template_name)
+    return count
@@ -0,0 +1,91 @@
+"""
+Defines functions for asking users to verify their email addresses.
+"""
+
+import json
+import os
+
+from django.conf import settings
+
+from drivers.mail import build_email, deliver_emails, get_queue
+from profiles import models
+
+
+# Stands in for each recipient's token when a verification email is
+# rendered once for a whole batch of recipients.
+EMAIL_TOKEN_PLACEHOLDER = 'TOKENPLACEHOLDER' * 2
+
+
+def _read_checkpoint(path):
+    """
+    Returns the primary key of the last user processed, or 0.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)['last_pk']
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, last_pk):
+    """
+    Saves progress to the checkpoint file, replacing it atomically so
+    that an interrupted write never leaves a corrupt file behind.
+    """
+    temp_path = '{0}.tmp'.format(path)
+    with open(temp_path, 'w') as f:
+        json.dump({'last_pk': last_pk}, f)
+    os.replace(temp_path, path)
+
+
+def send_email_verifications(users, batch_size=500, checkpoint_path=None):
+    """
+    Asks each of the given users to verify their email address again.
+
+    Users are processed in batches in primary key order. For each batch,
+    new email tokens replace the old ones in a single query, and the
+    emails are sent over a single connection to the mail server. The
+    email is rendered once, and each recipient's link is substituted
+    into it. Emails that can't be sent are added to the email queue to
+    be retried, so use a queue that outlives the caller, such as the
+    database queue.
+
+    If checkpoint_path is given, the last user processed is saved to it
+    after each batch, and a later call with the same path carries on
+    from there. The file is removed when every user has been processed.
+
+    Yields the number of emails sent in each batch.
+    """
+    text_template, html_template = models.EmailToken()._get_email_content(
+        EMAIL_TOKEN_PLACEHOLDER
+    )
+    from_email = 'noreply@{0}'.format(settings.DOMAIN)
+    last_pk = _read_checkpoint(checkpoint_path) if checkpoint_path else 0
+    while True:
+        batch = list(
+            users.filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+        )
+        if not batch:
+            break
+        emails = [
+            build_email(
+                'Verify Email Address',
+                text_template.replace(EMAIL_TOKEN_PLACEHOLDER, token),
+                from_email,
+                [user.email],
+                html_message=html_template.replace(
+                    EMAIL_TOKEN_PLACEHOLDER,
+                    token
+                )
+            )
+            for user, token in models.EmailToken.objects.create_tokens(batch)
+        ]
+        failed = deliver_emails(emails)
+        for email in failed:
+            get_queue().enqueue(email)
+        last_pk = batch[-1].pk
+        if checkpoint_path:
+            _write_checkpoint(checkpoint_path, last_pk)
+        yield len(emails) - len(failed)
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
@@ -2,47 +2,70 @@
 Defines view functions for creating and managing user accounts.
 """
 
-import asyncio
+import time
 
 from django.contrib import auth, messages
 from django.contrib.auth.decorators import login_required
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
 
 from profiles import forms, models, utils
+from profiles.background import run_in_background
+from profiles.caching import arender_anonymous_page, render_anonymous_page
+from profiles.throttling import (
+    forgotten_password_rate_limiter, get_client_ip, login_rate_limiter
+)
 
 
 User = auth.get_user_model()
 
+# Session key used to remember which user a reset password link belongs
+# to between displaying the reset password form and submitting it.
+RESET_PASSWORD_SESSION_KEY = '_reset_password_token'
 
-def login(request):
+
+async def login(request):
     if request.method == 'POST':
         form = forms.LoginForm(data=request.POST)
         if form.is_valid():
             username = form.cleaned_data['username']
             password = form.cleaned_data['password']
-            user = auth.authenticate(
+            identifiers = {
+                'ip': get_client_ip(request),
+                'user': username.lower(),
+            }
+            # The attempt is counted before the password is checked, so
+            # that concurrent guesses can't exceed the limit, and is
+            # removed again if it succeeds; only failures count.
+            if not await login_rate_limiter.aallow(**identifiers):
+                context = {'form': forms.LoginForm()}
+                return render(request, 'login.html', context, status=429)
+            user = await auth.aauthenticate(
                 request,
                 username=username,
                 password=password
             )
             if (user is not None):
-                auth.login(request, user)
+                await login_rate_limiter.arelease(**identifiers)
+                await auth.alogin(request, user)
                 return redirect('dashboard')
     context = {'form': forms.LoginForm()}
-    return render(request, 'login.html', context)
+    return await arender_anonymous_page(request, 'login.html', context)
 
 
 def forgotten_password(request):
     context = {'form': forms.ForgottenPasswordForm()}
-    return render(request, 'forgotten_password.html', context)
+    return render_anonymous_page(request, 'forgotten_password.html', context)
 
 
-async def sleeper():
-    """
-    Waits a fixed amount of time.
-    """
-    await asyncio.sleep(3)
+# Pads responses from forgotten_password_handler so that they don't
+# reveal whether an account exists for the submitted email address.
+forgotten_password_timer = utils.ResponseTimer(
+    'FORGOTTEN_PASSWORD_RESPONSE_TIME',
+    'FORGOTTEN_PASSWORD_RESPONSE_JITTER'
+)
 
 
 async def forgotten_password_handler(request):
@@ -50,23 +73,62 @@ async def forgotten_password_handler(request):
         form = forms.ForgottenPasswordForm(data=request.POST)
         if form.is_valid():
             email = form.cleaned_data['email']
-            first, second = await asyncio.gather(
-                sleeper(),
-                utils.reset_password(email=email)
-            )
+            if not await forgotten_password_rate_limiter.aallow(
+                ip=get_client_ip(request),
+                user=email.lower()
+            ):
+                return HttpResponse(status=429)
+            started = time.monotonic()
+            # The reset link is created and sent in the background, so
+            # the response takes the same time whether or not it's sent.
+            run_in_background(utils.reset_password, email)
+            await forgotten_password_timer.pad(started)
             return redirect('forgotten_password_confirmation')
     raise Http404()
 
 
 def forgotten_password_confirmation(request):
-    return render(request, 'forgotten_password_confirmation.html')
+    return render_anonymous_page(
+        request,
+        'forgotten_password_confirmation.html'
+    )
+
+
+async def _get_reset_password_user(request, email_token):
+    """
+    Returns the user that the given reset password token belongs to.
+
+    The user is remembered in the session when the reset password form
+    is displayed, so that submitting the form doesn't check the token a
+    second time.
+    """
+    token_digest = salted_hmac(
+        RESET_PASSWORD_SESSION_KEY,
+        email_token
+    ).hexdigest()
+    cached_token = await request.session.aget(RESET_PASSWORD_SESSION_KEY)
+    if (cached_token is not None
+            and constant_time_compare(cached_token['digest'], token_digest)
+            and cached_token['expires'] > timezone.now().timestamp()):
+        try:
+            return await User.objects.aget(pk=cached_token['user_id'])
+        except User.DoesNotExist:
+            raise models.ResetPasswordToken.DoesNotExist
+    reset_password_token = await models.ResetPasswordToken.objects.aget_token(
+        token=email_token
+    )
+    expires = reset_password_token.datetime + models.TOKEN_LIFETIME
+    await request.session.aset(RESET_PASSWORD_SESSION_KEY, {
+        'digest': token_digest,
+        'user_id': reset_password_token.user.pk,
+        'expires': expires.timestamp(),
+    })
+    return reset_password_token.user
 
 
-def reset_password(request, email_token):
+async def reset_password(request, email_token):
     try:
-        user = models.ResetPasswordToken.objects.check_token(
-            token=email_token
-        )
+        user = await _get_reset_password_user(request, email_token)
     except models.ResetPasswordToken.DoesNotExist:
         raise Http404()
     else:
@@ -74,8 +136,9 @@ def reset_password(request, email_token):
             form = forms.ResetPasswordForm(data=request.POST)
             if form.is_valid():
                 password = form.cleaned_data['password']
-                user.set_password(password)
-                user.save()
+                await user.aset_password(password)
+                await user.asave()
+                await request.session.apop(RESET_PASSWORD_SESSION_KEY)
                 return redirect('reset_password_confirmation')
         context = {
             'form': forms.ResetPasswordForm(),
@@ -85,17 +148,17 @@ def reset_password(request, email_token):
 
 
 def reset_password_confirmation(request):
-    return render(request, 'reset_password_confirmation.html')
+    return render_anonymous_page(request, 'reset_password_confirmation.html')
 
 
-def create_user(request):
+async def create_user(request):
     if request.method == 'POST':
         form = forms.CreateUserForm(data=request.POST)
         if form.is_valid():
             user = User(email=form.cleaned_data['email'])
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-            auth.login(request, user)
+            await user.aset_password(form.cleaned_data['password'])
+            await user.asave()
+            await auth.alogin(request, user)
             return redirect('add_mobile_number')
         errors = [text for value in form.errors.values() for text in value]
         for item in errors:
@@ -105,7 +168,7 @@ def create_user(request):
 
 
 @login_required
-def add_mobile_number(request):
+async def add_mobile_number(request):
     """
     Prompts a new user to add their mobile phone.
     """
@@ -113,8 +176,9 @@ def add_mobile_number(request):
         form = forms.MobileNumberVerificationForm(data=request.POST)
         if form.is_valid():
             sms_token = form.cleaned_data['sms_token']
-            if request.user.check_sms_token(sms_token):
-                request.user.create_email_token()
+            user = await request.auser()
+            if await user.acheck_sms_token(sms_token):
+                await user.acreate_email_token()
                 return redirect('create_user_success')
             else:
                 messages.error(request, 'Invalid SMS code.')
@@ -130,7 +194,7 @@ def create_user_success(request):
     return render(request, 'registration/create_user_success.html')
 
 
-def email_verification(request, verification_token):
+async def email_verification(request, verification_token):
     """
     The link a user must follow in order to verify their email address.
     """
@@ -140,7 +204,7 @@ def email_verification(request, verification_token):
     if form.is_valid():
         try:
             verification_token = form.cleaned_data['verification_token']
-            email_token = models.EmailToken.objects.check_token(
+            email_token = await models.EmailToken.objects.acheck_token(
                 token=verification_token
             )
         except models.EmailToken.DoesNotExist:
@@ -1,10 +1,16 @@
 const path = require('path');
 
-module.exports = {
-  mode: 'development',
-  entry: './javascript/mobile_verification.js',
-  output: {
-    filename: 'mobile_verification.js',
-    path: path.resolve(__dirname, 'static'),
-  },
+module.exports = (env, argv) => {
+  const production = argv.mode === 'production';
+  return {
+    // Production builds are minified. Django adds a hash of the
+    // contents to the file name when the static files are collected.
+    mode: production ? 'production' : 'development',
+    devtool: production ? false : 'eval',
+    entry: './javascript/mobile_verification.js',
+    output: {
+      filename: 'mobile_verification.js',
+      path: path.resolve(__dirname, 'static'),
+    },
+  };
 }